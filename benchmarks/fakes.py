@@ -0,0 +1,51 @@
+"""Local stand-ins for the external services pyro talks to."""
+
+import asyncio
+import os
+import random
+
+from langchain.schema.messages import AIMessageChunk
+
+FAKE_LLM_TOKENS = int(os.environ.get("FAKE_LLM_TOKENS", "200"))
+FAKE_LLM_TOKENS_PER_S = float(os.environ.get("FAKE_LLM_TOKENS_PER_S", "50"))
+FAKE_LLM_FIRST_TOKEN_MS = float(os.environ.get("FAKE_LLM_FIRST_TOKEN_MS", "300"))
+
+WORDS = (
+    "python list dict tuple set sort key lambda generator iterator decorator "
+    "class function module package import exception context manager async await "
+    "coroutine thread process queue string bytes file path json regex"
+).split()
+
+
+class FakeStreamingLLM:
+    """Streams ``FAKE_LLM_TOKENS`` words at a fixed rate after a first-token delay.
+
+    Accepts and ignores the keyword arguments of ``AzureChatOpenAI``.
+    """
+
+    def __init__(
+        self,
+        tokens: int = FAKE_LLM_TOKENS,
+        tokens_per_s: float = FAKE_LLM_TOKENS_PER_S,
+        first_token_ms: float = FAKE_LLM_FIRST_TOKEN_MS,
+        **kwargs,
+    ):
+        self.tokens = tokens
+        self.interval = 1 / tokens_per_s if tokens_per_s > 0 else 0
+        self.first_token_delay = first_token_ms / 1000
+
+    async def astream(self, messages, **kwargs):
+        rng = random.Random(len(messages))
+        await asyncio.sleep(self.first_token_delay)
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.interval)
+            yield AIMessageChunk(content=f"{rng.choice(WORDS)} ")
+
+
+def synthetic_chunks(count: int, words: int = 80, seed: int = 0):
+    """Yield ``(text, metadata)`` pairs of random Python-ish prose."""
+    rng = random.Random(seed)
+    for i in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(words))
+        yield text, {"file": f"synthetic-{i // 100}.pdf", "start_index": i % 100}
@@ -0,0 +1,248 @@
+"""Load-test /files/query and /files/upload against local stand-ins.
+
+Starts :mod:`benchmarks.serve` in a subprocess, drives a concurrent mix of
+streamed queries and uploads and writes a JSON report. With ``--baseline`` the
+p95 latency and time-to-first-token are compared against an earlier report
+and the exit status is non-zero on a regression.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+QUESTIONS = [
+    "How to use list comprehension?",
+    "Explain Python decorators",
+    "What are Python generators?",
+    "How to handle exceptions in Python?",
+    "How do I sort a list of dictionaries by key?",
+    "What is the purpose of the 'with' statement in Python?",
+    "Explain Python's asyncio and coroutines",
+    "How to read a json file?",
+]
+
+
+def _summary(values: list[float]) -> dict:
+    if not values:
+        return {}
+    data = np.array(values)
+    return {
+        "mean": round(float(data.mean()), 3),
+        "p50": round(float(np.percentile(data, 50)), 3),
+        "p95": round(float(np.percentile(data, 95)), 3),
+        "p99": round(float(np.percentile(data, 99)), 3),
+        "max": round(float(data.max()), 3),
+    }
+
+
+async def _query(client: httpx.AsyncClient, question: str, n_docs: int) -> dict:
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    event = "message"
+    params = {"question": question, "n_docs": n_docs}
+    async with client.stream("GET", "/files/query", params=params) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line.partition(":")[2].strip()
+            elif line.startswith("data:") and event == "message":
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                tokens += len(line.partition(":")[2].split())
+            elif not line:
+                if event == "error":
+                    raise RuntimeError("stream ended with an error event")
+                event = "message"
+    elapsed = time.perf_counter() - start
+    streaming = elapsed - (ttft or 0)
+    return {
+        "latency_ms": elapsed * 1000,
+        "ttft_ms": (ttft or elapsed) * 1000,
+        "tokens": tokens,
+        "tokens_per_s": tokens / streaming if streaming > 0 else 0.0,
+    }
+
+
+async def _upload(client: httpx.AsyncClient, path: str, unique: bool) -> dict:
+    name = os.path.basename(path)
+    if unique:
+        name = f"{random.getrandbits(48):012x}-{name}"
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = await client.post(
+            "/files/upload", files={"file": (name, f, "application/pdf")}
+        )
+    response.raise_for_status()
+    return {"latency_ms": (time.perf_counter() - start) * 1000}
+
+
+async def drive(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    kinds = [
+        "upload" if rng.random() < args.upload_ratio else "query"
+        for _ in range(args.requests)
+    ]
+    results = {"query": [], "upload": []}
+    errors = {"query": 0, "upload": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, limits=limits
+    ) as client:
+        await client.post("/_bench/reset")
+
+        async def one(kind: str):
+            async with semaphore:
+                try:
+                    if kind == "query":
+                        result = await _query(
+                            client, rng.choice(QUESTIONS), args.n_docs
+                        )
+                    else:
+                        result = await _upload(client, args.upload_file, args.unique)
+                except (httpx.HTTPError, RuntimeError):
+                    errors[kind] += 1
+                    return
+                results[kind].append(result)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(kind) for kind in kinds))
+        wall = time.perf_counter() - start
+        server_stats = (await client.get("/_bench/stats")).json()
+
+    queries = results["query"]
+    completed = len(queries) + len(results["upload"])
+    return {
+        "config": {
+            k: v for k, v in vars(args).items() if k not in ("output", "baseline")
+        },
+        "timestamp": time.time(),
+        "commit": _commit(),
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(completed / wall, 3),
+        "query": {
+            "count": len(queries),
+            "errors": errors["query"],
+            "latency_ms": _summary([r["latency_ms"] for r in queries]),
+            "ttft_ms": _summary([r["ttft_ms"] for r in queries]),
+            "tokens_per_s": _summary([r["tokens_per_s"] for r in queries]),
+            "total_tokens_per_s": round(sum(r["tokens"] for r in queries) / wall, 1),
+        },
+        "upload": {
+            "count": len(results["upload"]),
+            "errors": errors["upload"],
+            "latency_ms": _summary([r["latency_ms"] for r in results["upload"]]),
+        },
+        "server": server_stats,
+    }
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"benchmark server exited with {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health").is_success:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"benchmark server did not start within {timeout}s")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """List the metrics that got more than ``tolerance`` slower than ``baseline``."""
+    regressions = []
+    for section, metric in [
+        ("query", "latency_ms"),
+        ("query", "ttft_ms"),
+        ("upload", "latency_ms"),
+    ]:
+        old = baseline.get(section, {}).get(metric, {}).get("p95")
+        new = report[section][metric].get("p95")
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{section} {metric} p95: {old} -> {new}")
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upload-ratio", type=float, default=0.05)
+    parser.add_argument("--upload-file", default="pdfs/howto-sorting.pdf")
+    parser.add_argument(
+        "--no-unique",
+        dest="unique",
+        action="store_false",
+        help="upload under the same name so repeated uploads are skipped",
+    )
+    parser.add_argument("--n-docs", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--tokens-per-s", type=float, default=50)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--seed-chunks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    args.url = f"http://127.0.0.1:{args.port}"
+    env = {
+        **os.environ,
+        "BENCH_PORT": str(args.port),
+        "BENCH_SEED_CHUNKS": str(args.seed_chunks),
+        "FAKE_LLM_TOKENS": str(args.tokens),
+        "FAKE_LLM_TOKENS_PER_S": str(args.tokens_per_s),
+        "FAKE_LLM_FIRST_TOKEN_MS": str(args.first_token_ms),
+    }
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.serve"], env=env)
+    try:
+        _wait_ready(args.url, process, args.timeout)
+        report = asyncio.run(drive(args))
+    finally:
+        process.terminate()
+        process.wait()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
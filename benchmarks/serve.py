@@ -0,0 +1,111 @@
+"""Run the pyro API against local stand-ins for benchmarking.
+
+The LLM is replaced by :class:`FakeStreamingLLM` and, unless overridden in the
+environment, the local vector store with the hashing embedder is used and
+seeded with ``BENCH_SEED_CHUNKS`` synthetic chunks. The answer cache and query
+coalescing are off unless enabled in the environment, so every request runs
+the whole pipeline. ``GET /_bench/stats`` reports the event-loop lag and peak
+RSS of this process.
+"""
+
+import asyncio
+import os
+import resource
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+_workdir = tempfile.mkdtemp(prefix="pyro-bench-")
+os.environ.setdefault("STORE_BACKEND", "local")
+os.environ.setdefault("EMBEDDER", "hashing")
+os.environ.setdefault("LOCAL_STORE_DIR", os.path.join(_workdir, "vectors"))
+os.environ.setdefault("PARSE_CACHE_DIR", os.path.join(_workdir, "parsed"))
+os.environ.setdefault("INGEST_SPOOL_DIR", _workdir)
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "False")
+os.environ.setdefault("QUERY_COALESCING_ENABLED", "False")
+
+import numpy as np  # noqa: E402
+import uvicorn  # noqa: E402
+from src.pyro import server  # noqa: E402
+from src.pyro.utils import llm  # noqa: E402
+from src.pyro.utils.local_store import LocalStore  # noqa: E402
+
+from .fakes import FakeStreamingLLM, synthetic_chunks  # noqa: E402
+
+BENCH_SEED_CHUNKS = int(os.environ.get("BENCH_SEED_CHUNKS", "5000"))
+BENCH_LAG_INTERVAL_MS = float(os.environ.get("BENCH_LAG_INTERVAL_MS", "10"))
+
+llm.AzureChatOpenAI = FakeStreamingLLM
+
+
+class LagMonitor:
+    """Samples how late the event loop wakes up from a fixed-interval sleep."""
+
+    def __init__(self, interval: float = BENCH_LAG_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.samples: list[float] = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(loop.time() - start - self.interval, 0.0))
+
+    def stats(self) -> dict:
+        lags = np.array(self.samples or [0.0]) * 1000
+        return {
+            "samples": len(self.samples),
+            "p50": round(float(np.percentile(lags, 50)), 3),
+            "p99": round(float(np.percentile(lags, 99)), 3),
+            "max": round(float(lags.max()), 3),
+        }
+
+
+def _seed(store, count: int):
+    if not isinstance(store, LocalStore) or count <= 0 or store.count():
+        return
+    texts, metadatas = zip(*synthetic_chunks(count), strict=True)
+    store.add_texts(list(texts), list(metadatas))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    async with server.lifespan(app):
+        start = time.perf_counter()
+        await asyncio.to_thread(_seed, app.state.vectorstore, BENCH_SEED_CHUNKS)
+        app.state.seed_seconds = time.perf_counter() - start
+        app.state.lag = LagMonitor()
+        task = asyncio.create_task(app.state.lag.run())
+        yield
+        task.cancel()
+
+
+app = server.app
+app.router.lifespan_context = lifespan
+
+
+@app.get("/_bench/stats", include_in_schema=False)
+async def bench_stats():
+    return {
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "loop_lag_ms": app.state.lag.stats(),
+        "seed_seconds": round(app.state.seed_seconds, 3),
+    }
+
+
+@app.post("/_bench/reset", include_in_schema=False)
+async def bench_reset():
+    app.state.lag.samples.clear()
+    return {}
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        app,
+        host="127.0.0.1",
+        port=int(os.environ.get("BENCH_PORT", "8765")),
+        log_level="warning",
+    )
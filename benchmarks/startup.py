@@ -0,0 +1,105 @@
+"""Measure the cold start of each server role.
+
+Every role is started ``--repeat`` times in a fresh interpreter with the local
+vector store and the hashing embedder. The report has the median time to
+import the app, to run its startup, and from launching the interpreter to
+being ready to serve, the peak RSS after the imports and after startup, and
+which of the heavy libraries each role loaded.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROLES = ["all", "query", "ingest"]
+HEAVY_MODULES = ["unstructured", "pdfminer", "langchain.chat_models", "weaviate"]
+
+# Run in the child: starts the app's lifespan and prints one JSON line.
+_CHILD = """
+import asyncio, json, resource, sys, time
+
+def rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+start = time.perf_counter()
+from src.pyro import server
+imported = time.perf_counter()
+import_rss = rss()
+
+async def main():
+    async with server.app.router.lifespan_context(server.app):
+        print(json.dumps({
+            "import_s": imported - start,
+            "startup_s": time.perf_counter() - imported,
+            "import_rss_mb": import_rss,
+            "startup_rss_mb": rss(),
+            "loaded": [m for m in %r if m in sys.modules],
+        }), flush=True)
+
+asyncio.run(main())
+"""
+
+
+def _start(role: str, workdir: str) -> dict:
+    env = {
+        **os.environ,
+        "SERVER_ROLE": role,
+        "STORE_BACKEND": "local",
+        "EMBEDDER": "hashing",
+        "LOCAL_STORE_DIR": os.path.join(workdir, "vectors"),
+        "PARSE_CACHE_DIR": os.path.join(workdir, "parsed"),
+        "INGEST_SPOOL_DIR": workdir,
+    }
+    start = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-c", _CHILD % HEAVY_MODULES],
+        env=env,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = child.stdout.readline()
+    ready = time.perf_counter() - start
+    child.wait()
+    if not line:
+        raise RuntimeError(f"The {role} role failed to start")
+    return {**json.loads(line), "ready_s": ready}
+
+
+def measure(role: str, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="pyro-startup-") as workdir:
+        runs = [_start(role, workdir) for _ in range(repeat)]
+    report = {
+        key: round(float(np.median([run[key] for run in runs])), 3)
+        for key in ("ready_s", "import_s", "startup_s")
+    }
+    for key in ("import_rss_mb", "startup_rss_mb"):
+        report[key] = round(float(np.median([run[key] for run in runs])), 1)
+    report["loaded"] = runs[0]["loaded"]
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--roles", nargs="+", choices=ROLES, default=ROLES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="also write the report to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = {role: measure(role, args.repeat) for role in args.roles}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,24 +6,41 @@ import streamlit as st
 base_url = f'http://{os.environ.get("FASTAPI_HOST", "localhost")}:{os.environ.get("FASTAPI_PORT", "8000")}/files'
 
 
+def iter_sse_events(response):
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data: ") :])
+
+
 def get_ai_response(question):
     try:
         response = requests.get(
             f"{base_url}/query",
             params={"question": question, "temperature": 0.7, "n_docs": 10},
-            headers={"accept": "application/json"},
+            headers={"accept": "text/event-stream"},
+            stream=True,
         )
 
         if response.status_code == 200:
-            data = response.text
-            return data
+            for event, data in iter_sse_events(response):
+                if event == "message":
+                    yield data
+                elif event == "error":
+                    st.error(f"An error occurred: {data}")
+                elif event == "end":
+                    break
         else:
             st.session_state.history.append(
                 {
                     "error": f"Failed to get response, status code: {response.status_code}"
                 }
             )
-            return None
 
     except Exception as e:
         st.session_state.history.append({"error": f"An error occurred: {str(e)}"})
@@ -58,8 +75,8 @@ if submit_button and uploaded_file is not None and not st.session_state.file_upl
             headers={"accept": "application/json"},
         )
 
-        if response.status_code == 200:
-            st.success("File uploaded successfully.")
+        if response.ok:
+            st.success(f"File uploaded successfully, indexing job {response.json()['id']}.")
             st.session_state.file_uploaded = (
                 True  # Set the flag to True after successful upload
             )
@@ -73,16 +90,19 @@ if reset_upload_button:
     st.session_state.file_uploaded = False
     st.info("Upload state reset.")
 
+for message in st.session_state.messages:
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
 prompt = st.chat_input("Your question:")
 
 if prompt:
     st.session_state.messages.append({"role": "user", "content": prompt})
+    with st.chat_message("user"):
+        st.markdown(prompt)
 
-    ai_response = get_ai_response(prompt)
+    with st.chat_message("assistant"):
+        ai_response = st.write_stream(get_ai_response(prompt))
 
     if ai_response:
         st.session_state.messages.append({"role": "assistant", "content": ai_response})
-
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
@@ -1,5 +1,12 @@
 
-from evaluation_metrics.generation_metrics import evaluate_generation_metrics
+import argparse
+import asyncio
+
+from evaluation_metrics import judge, open_ai_service
+from evaluation_metrics.generation_metrics import (
+    evaluate_generation_metrics,
+    measure_latency,
+)
 from evaluation_metrics.retrieval_metrics import evaluate_retrieval_metrics
 
 # Example usage
@@ -145,8 +152,6 @@ ground_truth = [
     },
 ]
 
-evaluation_retrieval_results = evaluate_retrieval_metrics(test_queries, ground_truth)
-
 counterfactual_queries = [
     ("What is the difference between lists and tuples?", "What is the similarity between lists and tuples?"),
     ("How to use try-except in Python?", "Why should we avoid using try-except in Python?"),
@@ -182,6 +187,53 @@ for truth in ground_truth:
     relevant_contexts = "\n".join(truth["relevant_contexts"])
     truth_contexts.append(relevant_contexts)
 
-evaluation_gen_results = evaluate_generation_metrics(test_queries, truth_contexts, counterfactual_queries, negative_queries)
+
+
+async def main():
+    # Latency is measured first and serially, so that it is not inflated by
+    # queueing behind the concurrent evaluation below.
+    latency = await measure_latency(test_queries)
+    # The suites run one after the other so that at most EVAL_CONCURRENCY
+    # queries are in flight against the API and the judge.
+    retrieval_results = await evaluate_retrieval_metrics(test_queries, ground_truth)
+    generation_results = await evaluate_generation_metrics(
+        test_queries, truth_contexts, counterfactual_queries, negative_queries
+    )
+    return retrieval_results, {**generation_results, "latency": latency}
+
+
+parser = argparse.ArgumentParser(description="Evaluate the RAG pipeline.")
+parser.add_argument("--no-cache", action="store_true", help="neither read nor write the judge cache")
+parser.add_argument("--refresh-cache", action="store_true", help="ignore cached judgements and store fresh ones")
+parser.add_argument(
+    "--prune-cache",
+    type=float,
+    metavar="DAYS",
+    help="delete judgements not used in the last DAYS days (0 clears the cache) and exit",
+)
+parser.add_argument(
+    "--judge-mode",
+    choices=["batched", "separate"],
+    default=judge.mode,
+    help="score all metrics of a query in one judge call, or make one call per metric",
+)
+args = parser.parse_args()
+judge.mode = args.judge_mode
+
+cache = open_ai_service.judge_cache
+if args.prune_cache is not None:
+    if cache is not None:
+        print(f"Pruned {cache.prune(args.prune_cache)} cached judgements")
+    raise SystemExit
+if args.no_cache:
+    open_ai_service.judge_cache = cache = None
+elif args.refresh_cache and cache is not None:
+    cache.read = False
+
+evaluation_retrieval_results, evaluation_gen_results = asyncio.run(main())
 print(f"Retrieval Martrics: {evaluation_retrieval_results}")
 print(f"Generation Metrics: {evaluation_gen_results}")
+print(f"Judge calls: {dict(judge.stats)}")
+if cache is not None:
+    print(f"Judge cache: {cache.stats()}")
+
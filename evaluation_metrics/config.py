@@ -8,3 +8,25 @@ AZURE_DEPLOYMENT = os.getenv("AZURE_DEPLOYMENT")
 API_KEY = os.getenv("API_KEY")
 AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT")
 API_VERSION = os.getenv("API_VERSION")
+
+# Queries evaluated at once, and the Azure quota of the deployment. Judge calls
+# are throttled to stay within the quota; 429s are retried after a backoff.
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "60"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "60000"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "6"))
+OPENAI_BACKOFF = float(os.getenv("OPENAI_BACKOFF", "1.0"))
+# Completion tokens reserved per call when the call does not set max_tokens.
+OPENAI_COMPLETION_TOKENS = int(os.getenv("OPENAI_COMPLETION_TOKENS", "64"))
+
+# Judge responses are memoized on disk so re-runs only pay for changed inputs.
+JUDGE_CACHE_ENABLED = os.getenv("JUDGE_CACHE_ENABLED", "True") == "True"
+JUDGE_CACHE_PATH = os.getenv(
+    "JUDGE_CACHE_PATH", "evaluation_metrics/.cache/judgements.sqlite3"
+)
+
+# "batched" scores all metrics of a query in one JSON call, "separate" makes one
+# call per metric. JSON-schema output needs API version 2024-08-01-preview or later;
+# when the deployment rejects it, the reply is only constrained to a JSON object.
+JUDGE_MODE = os.getenv("JUDGE_MODE", "batched")
+JUDGE_STRUCTURED_OUTPUT = os.getenv("JUDGE_STRUCTURED_OUTPUT", "True") == "True"
@@ -1,22 +1,31 @@
+import asyncio
 import time
 
 import numpy as np
+from evaluation_metrics.harness import run_ordered
+from evaluation_metrics.judge import judge_metrics, parse_score
 from evaluation_metrics.open_ai_service import query_openai
+from evaluation_metrics.retrieval_metrics import aquery_api as query_rag
 from evaluation_metrics.retrieval_metrics import preprocess_markdown
-from evaluation_metrics.retrieval_metrics import query_api as query_rag
 from tqdm import tqdm
 
+GENERATION_METRICS = {
+    "faithfulness": "The degree to which the generated answer matches the ground truth.",
+    "answer_relevance": "The degree to which the generated answer is relevant to the user's query.",
+    "information_integration": "The ability to integrate and present information cohesively.",
+}
 
-def query_api(question, temperature=0.7, n_docs=10):
+
+async def query_api(question, temperature=0.7, n_docs=10):
     """Query the API and return the markdown response and latency."""
     start_time = time.time()
-    response = query_rag(question, temperature=temperature, n_docs=n_docs)
+    response = await query_rag(question, temperature=temperature, n_docs=n_docs)
     latency = time.time() - start_time
     return preprocess_markdown(response), latency
 
-def faithfulness(generated_answer, ground_truth):
+async def faithfulness(generated_answer, ground_truth):
     """Measure the accuracy and reliability of the generated answers."""
-    response = query_openai(
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -39,12 +48,12 @@ def faithfulness(generated_answer, ground_truth):
             },
         ],
     )
-    return float(response)
+    return parse_score(response)
 
 
-def answer_relevance(generated_answer, query):
+async def answer_relevance(generated_answer, query):
     """Evaluate the relevance of the generated answers to the user's query."""
-    response = query_openai(
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -67,11 +76,11 @@ def answer_relevance(generated_answer, query):
             },
         ],
     )
-    return float(response)
+    return parse_score(response)
 
-def information_integration(generated_answer):
+async def information_integration(generated_answer):
     """Assess the ability to integrate and present information cohesively."""
-    response = query_openai(
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -93,14 +102,15 @@ def information_integration(generated_answer):
             },
         ],
     )
-    return float(response)
+    return parse_score(response)
 
-def counterfactual_robustness(api_function, original_query, counterfactual_query):
+async def counterfactual_robustness(api_function, original_query, counterfactual_query):
     """Test the robustness of the system against counterfactual or contradictory queries."""
-    original_answer, _ = api_function(original_query)
-    counterfactual_answer, _ = api_function(counterfactual_query)
+    (original_answer, _), (counterfactual_answer, _) = await asyncio.gather(
+        api_function(original_query), api_function(counterfactual_query)
+    )
 
-    response = query_openai(
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -126,53 +136,68 @@ def counterfactual_robustness(api_function, original_query, counterfactual_query
         ],
     )
 
-    return float(response)
+    return parse_score(response)
 
-def negative_rejection(api_function, negative_query):
+async def negative_rejection(api_function, negative_query):
     """Measure the system's ability to reject and handle negative or inappropriate queries."""
-    answer, _ = api_function(negative_query)
+    answer, _ = await api_function(negative_query)
     return answer.strip().lower() == "i can't answer this question."
 
 
-
-
-def evaluate_generation_metrics(test_queries, ground_truth, counterfactual_queries, negative_queries):
+async def evaluate_query(query, truth):
+    """Score one answer on every per-query generation metric."""
+    generated_answer, _ = await query_api(query)
+    scores = await judge_metrics(
+        inputs={
+            "Query": query,
+            "Generated Answer": generated_answer,
+            "Ground Truth": truth,
+        },
+        metrics=GENERATION_METRICS,
+        fallbacks={
+            "faithfulness": lambda: faithfulness(generated_answer, truth),
+            "answer_relevance": lambda: answer_relevance(generated_answer, query),
+            "information_integration": lambda: information_integration(
+                generated_answer
+            ),
+        },
+    )
+    return scores
+
+
+async def measure_latency(queries):
+    """Time each query on its own, with no other request in flight."""
+    latencies = []
+    for query in tqdm(queries, desc="Measuring Latency"):
+        _, latency = await query_api(query)
+        latencies.append(latency)
+    return round(np.mean(latencies).item(), 2)
+
+
+async def evaluate_generation_metrics(
+    test_queries, ground_truth, counterfactual_queries, negative_queries
+):
+    metrics = list(GENERATION_METRICS)
+    scores = await run_ordered(
+        evaluate_query,
+        zip(test_queries, ground_truth, strict=False),
+        desc="Calculating Generation Metrics",
+    )
     results = {
-        'faithfulness': [],
-        'answer_relevance': [],
-        'information_integration': [],
-        'counterfactual_robustness': [],
-        'negative_rejection': [],
-        'latency': []
+        metric: [query_scores[i] for query_scores in scores]
+        for i, metric in enumerate(metrics)
     }
-
-    # Calculate total steps (queries + 1 for noise robustness)
-    total_steps = len(test_queries) + len(counterfactual_queries) + len(negative_queries)
-
-    # Create progress bar
-    progress_bar = tqdm(total=total_steps, desc="Calculating Generation Metrics", unit="step")
-
-    for query, truth in zip(test_queries, ground_truth, strict=False):
-        generated_answer, latency = query_api(query)
-
-        results['faithfulness'].append(faithfulness(generated_answer, truth))
-        results['answer_relevance'].append(answer_relevance(generated_answer, query))
-        results['information_integration'].append(information_integration(generated_answer))
-        results['latency'].append(latency)
-        progress_bar.update(1)
-
-    for original, counterfactual in counterfactual_queries:
-        results['counterfactual_robustness'].append(
-            counterfactual_robustness(query_api, original, counterfactual)
-        )
-        progress_bar.update(1)
-
-    for negative_query in negative_queries:
-        results['negative_rejection'].append(
-            negative_rejection(query_api, negative_query)
-        )
-        progress_bar.update(1)
-
-
+    results["counterfactual_robustness"] = await run_ordered(
+        lambda original, counterfactual: counterfactual_robustness(
+            query_api, original, counterfactual
+        ),
+        counterfactual_queries,
+        desc="Calculating Counterfactual Robustness",
+    )
+    results["negative_rejection"] = await run_ordered(
+        lambda negative_query: negative_rejection(query_api, negative_query),
+        ((query,) for query in negative_queries),
+        desc="Calculating Negative Rejection",
+    )
 
     return {metric: round(np.mean(scores).item(), 2) for metric, scores in results.items()}
@@ -0,0 +1,38 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+
+from evaluation_metrics.config import EVAL_CONCURRENCY
+from tqdm import tqdm
+
+
+async def run_ordered(
+    fn: Callable[..., Awaitable],
+    items: Iterable[tuple],
+    concurrency: int = EVAL_CONCURRENCY,
+    desc: str | None = None,
+) -> list:
+    """Await ``fn(*item)`` for every item with a pool of ``concurrency`` workers.
+
+    Results are returned in the order of ``items`` regardless of the order in
+    which they complete. The first failure cancels the remaining work.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        queue.put_nowait((index, item))
+    progress = tqdm(total=len(items), desc=desc, unit="query")
+
+    async def worker():
+        while not queue.empty():
+            index, item = queue.get_nowait()
+            results[index] = await fn(*item)
+            progress.update(1)
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            for _ in range(min(concurrency, len(items))):
+                group.create_task(worker())
+    finally:
+        progress.close()
+    return results
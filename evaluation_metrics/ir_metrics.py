@@ -0,0 +1,121 @@
+"""Offline retrieval metrics against labeled chunks.
+
+Every question is sent to ``/files/retrieve`` once, at the largest k, and
+recall@k, MRR@k and nDCG@k are computed for every k from that ranking, so no
+LLM tokens are spent. A label is either a chunk id or a span of a file,
+``{"file": ..., "start": ..., "end": ...}`` in characters, which any chunk
+overlapping it matches; span labels stay valid when the chunk size changes.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from evaluation_metrics.harness import run_ordered
+from evaluation_metrics.retrieval_metrics import retrieve
+
+# Rank given to labels that were not retrieved at all.
+MISSED = 2**31 - 1
+
+
+def _matches(chunk: dict, label) -> bool:
+    if isinstance(label, str):
+        return chunk["id"] == label
+    if chunk["file"] != label["file"] or chunk["start_index"] is None:
+        return False
+    end = chunk["start_index"] + len(chunk["content"])
+    return chunk["start_index"] < label["end"] and label["start"] < end
+
+
+def first_hits(rankings: list[list[dict]], labels: list[list]) -> np.ndarray:
+    """Rank of the first chunk matching each label, ``-1`` for padding.
+
+    Returns a ``(queries, max labels)`` array; labels that were not retrieved
+    get :data:`MISSED`.
+    """
+    width = max((len(query_labels) for query_labels in labels), default=0)
+    hits = np.full((len(labels), width), -1, dtype=np.int64)
+    for q, (chunks, query_labels) in enumerate(zip(rankings, labels, strict=True)):
+        for i, label in enumerate(query_labels):
+            ranks = [r for r, chunk in enumerate(chunks) if _matches(chunk, label)]
+            hits[q, i] = ranks[0] if ranks else MISSED
+    return hits
+
+
+def ir_metrics(hits: np.ndarray, ks: list[int]) -> dict:
+    """Mean recall@k, MRR@k and nDCG@k over the queries with labels.
+
+    Each label counts once, at the first chunk that matches it, so several
+    chunks covering one span do not inflate the scores. nDCG counts each
+    chunk once too, however many labels it matches, and the ideal ranking
+    holds one chunk per retrieved rank plus one per missed label.
+    """
+    mask = hits >= 0
+    hits = hits[mask.any(axis=1)]
+    mask = mask[mask.any(axis=1)]
+    if not len(hits):
+        return {}
+    depth = max(ks)
+    k = np.asarray(ks)[:, None, None]
+    found = mask & (hits < k)  # (ks, queries, labels)
+    labels = mask.sum(axis=1)
+
+    recall = found.sum(axis=2) / labels
+    first = np.where(mask, hits, MISSED).min(axis=1)
+    mrr = np.where(first < k[:, :, 0], 1 / (first + 1), 0.0)
+
+    retrieved = mask & (hits < depth)
+    relevant = np.zeros((len(hits), depth), dtype=bool)  # (queries, ranks)
+    rows, cols = np.nonzero(retrieved)
+    relevant[rows, hits[rows, cols]] = True
+    discount = 1 / np.log2(np.arange(depth) + 2)
+    dcg = np.cumsum(relevant * discount, axis=1)[:, np.asarray(ks) - 1].T
+    items = relevant.sum(axis=1) + (mask & ~retrieved).sum(axis=1)
+    idcg = np.cumsum(discount)[np.minimum(items, k[:, :, 0]) - 1]
+
+    return {
+        f"@{value}": {
+            "recall": round(float(recall[i].mean()), 4),
+            "mrr": round(float(mrr[i].mean()), 4),
+            "ndcg": round(float((dcg[i] / idcg[i]).mean()), 4),
+        }
+        for i, value in enumerate(ks)
+    }
+
+
+async def evaluate(labeled: list[dict], ks: list[int], concurrency: int) -> dict:
+    start = time.perf_counter()
+    rankings = await run_ordered(
+        lambda question: asyncio.to_thread(retrieve, question, n_docs=max(ks)),
+        ((item["question"],) for item in labeled),
+        concurrency=concurrency,
+        desc="Retrieving",
+    )
+    hits = first_hits(rankings, [item["relevant"] for item in labeled])
+    return {
+        "queries": len(labeled),
+        "elapsed_s": round(time.perf_counter() - start, 2),
+        **ir_metrics(hits, ks),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--labels",
+        required=True,
+        help='JSON list of {"question": ..., "relevant": [chunk id or span, ...]}',
+    )
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--concurrency", type=int, default=8)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.labels) as f:
+        labeled = json.load(f)
+    ks = sorted(set(args.k))
+    print(json.dumps(asyncio.run(evaluate(labeled, ks, args.concurrency)), indent=2))
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import math
+import re
+from collections import Counter
+from collections.abc import Awaitable, Callable
+
+import openai
+from evaluation_metrics.config import JUDGE_MODE, JUDGE_STRUCTURED_OUTPUT
+from evaluation_metrics.open_ai_service import query_openai
+
+# Set from the command line by calculate_metrics.
+mode = JUDGE_MODE
+# Cleared for the rest of the run if the deployment rejects JSON-schema output.
+structured = JUDGE_STRUCTURED_OUTPUT
+stats = Counter()
+
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def _score(value) -> float | None:
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        return None
+    if math.isfinite(value) and 0.0 <= value <= 1.0:
+        return float(value)
+    return None
+
+
+def parse_score(response: str) -> float:
+    """Read a judge response that is only a number or a JSON ``score`` field.
+
+    Anything else, or a score outside [0, 1], raises ValueError rather than
+    guessing which number in the text was meant.
+    """
+    text = (response or "").strip()
+    if _NUMBER.fullmatch(text):
+        value = float(text)
+    else:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            value = None
+        value = value.get("score") if isinstance(value, dict) else None
+    score = _score(value)
+    if score is None:
+        raise ValueError(f"No score in judge response: {response!r}")
+    return score
+
+
+def _response_format(metrics: dict[str, str]) -> dict:
+    if not structured:
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "scores",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {name: {"type": "number"} for name in metrics},
+                "required": list(metrics),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def _messages(inputs: dict[str, str], metrics: dict[str, str]) -> list:
+    definitions = "\n".join(f"- {name}: {text}" for name, text in metrics.items())
+    values = "\n".join(f"{name}: {value}," for name, value in inputs.items())
+    return [
+        {
+            "role": "system",
+            "content": f"""
+            We are evaluating a RAG Pipeline. You will get the {", ".join(inputs)}.
+            Score them on each of the following metrics:
+            {definitions}
+            """,
+        },
+        {"role": "user", "content": values},
+        {
+            "role": "system",
+            "content": f"""Return only a JSON object with the keys {", ".join(metrics)}.
+            Each value should be a single float between 0 and 1.""",
+        },
+    ]
+
+
+def _validate(response: str, metrics: dict[str, str]) -> dict[str, float]:
+    """The metrics with a valid score in ``response``; invalid ones are left out."""
+    try:
+        scores = json.loads(response or "")
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(scores, dict):
+        return {}
+    valid = {name: _score(scores.get(name)) for name in metrics}
+    return {name: score for name, score in valid.items() if score is not None}
+
+
+async def judge_metrics(
+    inputs: dict[str, str],
+    metrics: dict[str, str],
+    fallbacks: dict[str, Callable[[], Awaitable[float]]],
+) -> list[float]:
+    """Score ``inputs`` on every metric and return the scores in metric order.
+
+    ``metrics`` maps each metric to its definition and ``fallbacks`` to the
+    coroutine function that judges it on its own. In batched mode one
+    JSON-constrained call scores all metrics; a metric missing from the reply
+    or scored outside [0, 1] is judged again by its fallback. If the
+    deployment rejects the JSON schema, the run falls back to a plain JSON
+    object, and if it rejects that too, to separate mode.
+    """
+    global mode, structured
+    scores = {}
+    if mode == "batched":
+        stats["batched_calls"] += 1
+        try:
+            response = await query_openai(
+                messages=_messages(inputs, metrics),
+                response_format=_response_format(metrics),
+            )
+            scores = _validate(response, metrics)
+        except openai.BadRequestError:
+            # The deployment or API version does not support this response
+            # format: JSON-schema output needs 2024-08-01-preview or later.
+            stats["batched_rejected"] += 1
+            if structured:
+                structured = False
+            else:
+                mode = "separate"
+    missing = [name for name in metrics if name not in scores]
+    stats["separate_calls"] += len(missing)
+    results = await asyncio.gather(*(fallbacks[name]() for name in missing))
+    scores.update(zip(missing, results, strict=True))
+    return [scores[name] for name in metrics]
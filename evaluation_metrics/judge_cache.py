@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from evaluation_metrics.config import JUDGE_CACHE_PATH
+
+
+def cache_key(deployment: str, messages: list, **kwargs) -> str:
+    """Hash of everything that determines a judge response."""
+    payload = json.dumps(
+        {"deployment": deployment, "messages": messages, **kwargs},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class JudgeCache:
+    """Judge responses stored in SQLite, keyed by :func:`cache_key`.
+
+    The database runs in WAL mode with a busy timeout, so several evaluation
+    runs can read and write it at the same time. ``read`` can be turned off
+    to refresh entries without using them.
+    """
+
+    def __init__(self, path: str = JUDGE_CACHE_PATH, read: bool = True):
+        self.path = path
+        self.read = read
+        self.hits = 0
+        self.misses = 0
+        self._connection: sqlite3.Connection | None = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS judgements (
+                    key TEXT PRIMARY KEY,
+                    deployment TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection = connection
+        return self._connection
+
+    def get(self, key: str) -> str | None:
+        if not self.read:
+            return None
+        row = self.connection.execute(
+            "SELECT response FROM judgements WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute(
+            "UPDATE judgements SET used_at = ? WHERE key = ?", (time.time(), key)
+        )
+        return row[0]
+
+    def put(self, key: str, deployment: str, response: str):
+        now = time.time()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO judgements VALUES (?, ?, ?, ?, ?)",
+            (key, deployment, response, now, now),
+        )
+
+    def prune(self, max_age_days: float) -> int:
+        """Delete entries that were not used in the last ``max_age_days``."""
+        cutoff = time.time() - max_age_days * 86400
+        deleted = self.connection.execute(
+            "DELETE FROM judgements WHERE used_at < ?", (cutoff,)
+        ).rowcount
+        self.connection.execute("VACUUM")
+        return deleted
+
+    def stats(self) -> dict:
+        entries = self.connection.execute("SELECT COUNT(*) FROM judgements").fetchone()
+        return {"entries": entries[0], "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -1,21 +1,135 @@
+import asyncio
+import random
+import time
+
+import openai
 from evaluation_metrics.config import (
     API_KEY,
     API_VERSION,
     AZURE_DEPLOYMENT,
     AZURE_ENDPOINT,
+    JUDGE_CACHE_ENABLED,
+    OPENAI_BACKOFF,
+    OPENAI_COMPLETION_TOKENS,
+    OPENAI_MAX_RETRIES,
+    OPENAI_RPM,
+    OPENAI_TPM,
 )
-from openai import AzureOpenAI
+from evaluation_metrics.judge_cache import JudgeCache, cache_key
+from openai import AsyncAzureOpenAI
 
-client = AzureOpenAI(
+# Retries are handled below so that they go through the rate limiter.
+client = AsyncAzureOpenAI(
     api_key=API_KEY,
     azure_endpoint=AZURE_ENDPOINT,
     api_version=API_VERSION,
     azure_deployment=AZURE_DEPLOYMENT,
+    max_retries=0,
+)
+
+RETRY_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
 )
 
-def query_openai(messages: list):
-    response = client.chat.completions.create(
-        model= AZURE_DEPLOYMENT,
-        messages= messages
-    )
-    return response.choices[0].message.content
+
+class TokenBucket:
+    """Hands out ``per_minute`` units a minute, refilled continuously.
+
+    Azure enforces quotas over windows of a few seconds, so the bucket holds
+    at most ten seconds' worth of units to keep bursts within the quota.
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, per_minute / 6)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.level = min(
+                    self.capacity, self.level + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+
+class RateLimiter:
+    """Keeps judge calls within the requests and tokens per minute quota."""
+
+    def __init__(self, rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._resume_at = 0.0
+
+    async def acquire(self, tokens: int):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.requests.acquire()
+        await self.tokens.acquire(tokens)
+
+    def pause(self, seconds: float):
+        """Hold back every caller after the service reported a rate limit."""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+limiter = RateLimiter()
+judge_cache = JudgeCache() if JUDGE_CACHE_ENABLED else None
+
+
+def estimate_tokens(messages: list, max_tokens: int | None = None) -> int:
+    """Roughly four characters a token, plus the completion that may come back."""
+    prompt = sum(len(m["content"]) // 4 + 4 for m in messages)
+    return prompt + (max_tokens or OPENAI_COMPLETION_TOKENS)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return OPENAI_BACKOFF * 2**attempt * (1 + random.random())
+
+
+async def query_openai(messages: list, **kwargs):
+    key = None
+    if judge_cache is not None:
+        key = cache_key(AZURE_DEPLOYMENT, messages, **kwargs)
+        cached = judge_cache.get(key)
+        if cached is not None:
+            return cached
+    tokens = estimate_tokens(messages, kwargs.get("max_tokens"))
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        await limiter.acquire(tokens)
+        try:
+            response = await client.chat.completions.create(
+                model=AZURE_DEPLOYMENT, messages=messages, **kwargs
+            )
+        except RETRY_ERRORS as e:
+            if attempt == OPENAI_MAX_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            if isinstance(e, openai.RateLimitError):
+                limiter.pause(delay)
+            await asyncio.sleep(delay)
+            continue
+        content = response.choices[0].message.content
+        if key is not None and content is not None:
+            judge_cache.put(key, AZURE_DEPLOYMENT, content)
+        return content
@@ -1,11 +1,20 @@
+import asyncio
 from urllib.parse import quote
 
 import markdown
 import numpy as np
 import requests
 from bs4 import BeautifulSoup
+from evaluation_metrics.harness import run_ordered
+from evaluation_metrics.judge import judge_metrics, parse_score
 from evaluation_metrics.open_ai_service import query_openai
-from tqdm import tqdm
+
+RETRIEVAL_METRICS = {
+    "context_precision": "Measure how accurately the retrieved context matches the user's query.",
+    "context_recall": "Evaluate the ability to retrieve all relevant contexts for the user's query.",
+    "context_relevance": "Assess the relevance of the retrieved context to the user's query.",
+    "context_entity_recall": "Determine the ability to recall relevant entities within the context.",
+}
 
 
 def preprocess_markdown(markdown_text):
@@ -15,9 +24,9 @@ def preprocess_markdown(markdown_text):
     return text.strip()
 
 
-def context_precision(query, retrieved_context, relevant_contexts):
+async def context_precision(query, retrieved_context, relevant_contexts):
     """Measure how accurately the retrieved context matches the user's query."""
-    response = query_openai(
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -42,12 +51,12 @@ def context_precision(query, retrieved_context, relevant_contexts):
             },
         ],
     )
-    return float(response)
+    return parse_score(response)
 
 
-def context_recall(query, retrieved_context, relevant_contexts):
+async def context_recall(query, retrieved_context, relevant_contexts):
     """Evaluate the ability to retrieve all relevant contexts for the user's query."""
-    response = query_openai(
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -72,12 +81,12 @@ def context_recall(query, retrieved_context, relevant_contexts):
             },
         ],
     )
-    return float(response)
+    return parse_score(response)
 
 
-def context_relevance(retrieved_context, query):
+async def context_relevance(retrieved_context, query):
     """Assess the relevance of the retrieved context to the user's query."""
-    response = query_openai(
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -100,14 +109,14 @@ def context_relevance(retrieved_context, query):
             },
         ],
     )
-    return float(response)
+    return parse_score(response)
 
 
-def context_entity_recall(retrieved_context, relevant_entities):
+async def context_entity_recall(retrieved_context, relevant_entities):
     """
     Determine the ability to recall relevant entities within the context.
     """
-    response = query_openai(
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -130,19 +139,21 @@ def context_entity_recall(retrieved_context, relevant_entities):
             },
         ],
     )
-    return float(response)
+    return parse_score(response)
 
 
-def noise_robustness(api_function, noisy_queries, clean_queries):
+async def noise_robustness(api_function, noisy_queries, clean_queries):
     """Test the system's ability to handle noisy or irrelevant inputs."""
-    noisy_results = [
-        preprocess_markdown(api_function(query)) for query in noisy_queries
-    ]
-    clean_results = [
-        preprocess_markdown(api_function(query)) for query in clean_queries
-    ]
-
-    response = query_openai(
+    answers = await run_ordered(
+        api_function,
+        ((query,) for query in [*noisy_queries, *clean_queries]),
+        desc="Querying noisy and clean queries",
+    )
+    answers = [preprocess_markdown(answer) for answer in answers]
+    noisy_results = answers[: len(noisy_queries)]
+    clean_results = answers[len(noisy_queries) :]
+
+    response = await query_openai(
         messages=[
             {
                 "role": "system",
@@ -166,7 +177,7 @@ def noise_robustness(api_function, noisy_queries, clean_queries):
             },
         ],
     )
-    return float(response)
+    return parse_score(response)
 
 
 def generate_noisy_queries(queries):
@@ -182,52 +193,93 @@ def generate_noisy_queries(queries):
     return noisy_queries
 
 
+def read_sse_message(response):
+    """Join the data of all `message` events in a server-sent event stream."""
+    chunks, event, data = [], "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if event == "message":
+                chunks.append("\n".join(data))
+            elif event == "error":
+                raise RuntimeError("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data: ") :])
+    return "".join(chunks)
+
+
 def query_api(question, temperature=0.7, n_docs=10):
     """Query the API and return the markdown response."""
     url = f"http://localhost:8000/files/query?question={quote(question)}&temperature={temperature}&n_docs={n_docs}"
-    response = requests.get(url, headers={"accept": "application/json"}, stream=True)
+    response = requests.get(url, headers={"accept": "text/event-stream"}, stream=True)
+    response.raise_for_status()
+    return read_sse_message(response)
+
+
+def retrieve(question, n_docs=10):
+    """Return the top ``n_docs`` chunks for the question, without an answer."""
+    response = requests.get(
+        "http://localhost:8000/files/retrieve",
+        params={"question": question, "n_docs": n_docs},
+    )
     response.raise_for_status()
-    return response.text
+    return response.json()
 
 
-def evaluate_retrieval_metrics(test_queries, ground_truth):
+async def aquery_api(question, temperature=0.7, n_docs=10):
+    """Run :func:`query_api` in a thread so that queries can overlap."""
+    return await asyncio.to_thread(
+        query_api, question, temperature=temperature, n_docs=n_docs
+    )
+
+
+async def evaluate_query(query, truth):
+    """Score one query on every per-query retrieval metric."""
+    chunks = await asyncio.to_thread(retrieve, query)
+    retrieved_context = [chunk["content"] for chunk in chunks]
+    contexts, entities = truth["relevant_contexts"], truth["relevant_entities"]
+    return await judge_metrics(
+        inputs={
+            "Query": query,
+            "Retrieved Context": retrieved_context,
+            "Relevant Context List": contexts,
+            "Relevant Entities": entities,
+        },
+        metrics=RETRIEVAL_METRICS,
+        fallbacks={
+            "context_precision": lambda: context_precision(
+                query, retrieved_context, contexts
+            ),
+            "context_recall": lambda: context_recall(
+                query, retrieved_context, contexts
+            ),
+            "context_relevance": lambda: context_relevance(retrieved_context, query),
+            "context_entity_recall": lambda: context_entity_recall(
+                retrieved_context, entities
+            ),
+        },
+    )
+
+
+async def evaluate_retrieval_metrics(test_queries, ground_truth):
+    metrics = list(RETRIEVAL_METRICS)
+    scores = await run_ordered(
+        evaluate_query,
+        zip(test_queries, ground_truth, strict=False),
+        desc="Calculating Retrieval metrics",
+    )
     results = {
-        "context_precision": [],
-        "context_recall": [],
-        "context_relevance": [],
-        "context_entity_recall": [],
+        metric: [query_scores[i] for query_scores in scores]
+        for i, metric in enumerate(metrics)
     }
 
-    # Calculate total steps (queries + 1 for noise robustness)
-    total_steps = len(test_queries) + 1
-
-    # Create progress bar
-    progress_bar = tqdm(total=total_steps, desc="Calculating Retrieval metrics")
-
-    # Main evaluation loop
-    for query, truth in zip(test_queries, ground_truth, strict=False):
-        retrieved_context = query_api(query)
-        results["context_precision"].append(
-            context_precision(query, retrieved_context, truth["relevant_contexts"])
-        )
-        results["context_recall"].append(
-            context_recall(query, retrieved_context, truth["relevant_contexts"])
-        )
-        results["context_relevance"].append(context_relevance(retrieved_context, query))
-        results["context_entity_recall"].append(
-            context_entity_recall(retrieved_context, truth["relevant_entities"])
-        )
-        progress_bar.update(1)
-
     # Generate noisy queries and calculate noise robustness
     noisy_queries = generate_noisy_queries(test_queries)
-    results["noise_robustness"] = noise_robustness(
-        query_api, noisy_queries, test_queries
+    results["noise_robustness"] = await noise_robustness(
+        aquery_api, noisy_queries, test_queries
     )
-    progress_bar.update(1)
-
-    # Close the progress bar
-    progress_bar.close()
 
     return {
         metric: round(np.mean(scores).item(), 2) for metric, scores in results.items()
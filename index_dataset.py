@@ -1,27 +1,207 @@
+"""Bulk-index a folder of PDFs through the API.
+
+Files are uploaded concurrently and each upload waits for its ingestion job to
+finish. Failed attempts are retried with exponential backoff, and every file
+that succeeds is recorded in a manifest so an interrupted run can be resumed
+by running the script again.
+"""
+
+import argparse
+import asyncio
+import json
 import os
+import random
+import statistics
+import time
 
-import requests
+import httpx
 from tqdm import tqdm
 
-# Define the folder containing the PDF files and the API endpoint
-folder_path = 'pdfs'
-api_endpoint = 'http://localhost:8000/files/upload?chunk_size=200'
+# 404 means the job was lost, e.g. when the API restarted while it was running.
+RETRY_STATUSES = {404, 429, 500, 502, 503, 504}
+
+
+class JobFailed(Exception):
+    pass
+
+
+class Manifest:
+    """JSON record of the files that were indexed successfully."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(file_path: str, chunk_size: int) -> dict:
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "chunk_size": chunk_size}
+
+    def is_done(self, name: str, key: dict) -> bool:
+        entry = self.entries.get(name)
+        return entry is not None and all(entry.get(k) == v for k, v in key.items())
+
+    def record(self, name: str, entry: dict):
+        self.entries[name] = entry
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def _retry_after(response: httpx.Response | None, attempt: int, backoff: float):
+    if response is not None and "retry-after" in response.headers:
+        try:
+            return float(response.headers["retry-after"])
+        except ValueError:
+            pass
+    return backoff * 2**attempt * (1 + random.random())
+
+
+async def _upload(client: httpx.AsyncClient, file_path: str, chunk_size: int):
+    with open(file_path, "rb") as f:
+        files = {"file": (os.path.basename(file_path), f, "application/pdf")}
+        response = await client.post(
+            "/files/upload", params={"chunk_size": chunk_size}, files=files
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+async def _wait(client: httpx.AsyncClient, job: dict, poll_interval: float):
+    while job["status"] not in ("completed", "failed"):
+        await asyncio.sleep(poll_interval)
+        response = await client.get(f"/files/jobs/{job['id']}")
+        response.raise_for_status()
+        job = response.json()
+    if job["status"] == "failed":
+        raise JobFailed(f"job {job['id']} failed: {job['error']}")
+    if job.get("chunks_failed") or job.get("errors"):
+        # The API does not mark partially indexed files as current, so
+        # uploading again only writes the chunks that are missing.
+        raise JobFailed(
+            f"job {job['id']} failed to index {job.get('chunks_failed', 0)} chunks"
+        )
+    return job
+
+
+async def index_file(
+    client: httpx.AsyncClient, file_path: str, args: argparse.Namespace
+) -> dict:
+    """Upload ``file_path`` and wait for its job, retrying failed attempts."""
+    for attempt in range(args.retries + 1):
+        response = None
+        try:
+            job = await _upload(client, file_path, args.chunk_size)
+            return await _wait(client, job, args.poll_interval)
+        except httpx.HTTPStatusError as e:
+            response = e.response
+            if response.status_code not in RETRY_STATUSES:
+                raise
+            error = e
+        except (httpx.TransportError, JobFailed) as e:
+            error = e
+        if attempt == args.retries:
+            raise error
+        delay = _retry_after(response, attempt, args.backoff)
+        tqdm.write(f"Retrying {os.path.basename(file_path)} in {delay:.1f}s: {error}")
+        await asyncio.sleep(delay)
+
+
+def _percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def report(results: list[dict], skipped: int, failed: int, elapsed: float) -> dict:
+    latencies = [r["seconds"] for r in results]
+    megabytes = sum(r["size"] for r in results) / 1024**2
+    chunks = sum(r["chunks"] for r in results)
+    return {
+        "indexed": len(results),
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 2),
+        "files_per_s": round(len(results) / elapsed, 3) if elapsed else 0.0,
+        "mb_per_s": round(megabytes / elapsed, 3) if elapsed else 0.0,
+        "chunks_per_s": round(chunks / elapsed, 1) if elapsed else 0.0,
+        "latency_s": {
+            "p50": round(_percentile(latencies, 50), 2),
+            "p95": round(_percentile(latencies, 95), 2),
+            "max": round(max(latencies, default=0.0), 2),
+        },
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    manifest = Manifest(args.manifest)
+    names = sorted(f for f in os.listdir(args.folder) if f.endswith(".pdf"))
+    pending = []
+    for name in names:
+        key = Manifest.key(os.path.join(args.folder, name), args.chunk_size)
+        if args.force or not manifest.is_done(name, key):
+            pending.append((name, key))
+    skipped = len(names) - len(pending)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results, failed = [], 0
+    progress = tqdm(total=len(pending), desc="Indexing PDF files", unit="file")
+
+    async def worker(client: httpx.AsyncClient, name: str, key: dict):
+        nonlocal failed
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                job = await index_file(client, os.path.join(args.folder, name), args)
+            except Exception as e:
+                failed += 1
+                tqdm.write(f"Failed to index: {name}: {e}")
+                return
+            finally:
+                progress.update()
+            result = {
+                **key,
+                "job": job["id"],
+                "chunks": job["chunks_total"],
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            manifest.record(name, result)
+            results.append(result)
 
-# Get a list of all PDF files in the folder
-pdf_files = [f for f in os.listdir(folder_path) if f.endswith('.pdf')]
+    start = time.perf_counter()
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.api, timeout=timeout, limits=limits
+    ) as client:
+        await asyncio.gather(*(worker(client, name, key) for name, key in pending))
+    progress.close()
+    return report(results, skipped, failed, time.perf_counter() - start)
 
-# Upload each PDF file with a progress bar
-for pdf_file in tqdm(pdf_files, desc="Uploading PDF files", unit="file"):
-    file_path = os.path.join(folder_path, pdf_file)
 
-    with open(file_path, 'rb') as f:
-        files = {'file': (pdf_file, f, 'application/pdf')}
-        headers = {'accept': 'application/json'}
-        response = requests.post(api_endpoint, headers=headers, files=files)
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--folder", default="pdfs")
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument(
+        "--backoff", type=float, default=1.0, help="base retry delay in seconds"
+    )
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--manifest", default=".index_manifest.json")
+    parser.add_argument(
+        "--force", action="store_true", help="ignore the manifest and index all files"
+    )
+    return parser.parse_args()
 
-        if response.status_code == 200:
-            tqdm.write(f"Successfully uploaded: {pdf_file}")
-        else:
-            tqdm.write(f"Failed to upload: {pdf_file}, Status Code: {response.status_code}")
 
-print("All files have been processed.")
+if __name__ == "__main__":
+    summary = asyncio.run(run(parse_args()))
+    print(json.dumps(summary, indent=2))
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, UploadFile
+from fastapi import APIRouter, Depends, Request
 from starlette.responses import StreamingResponse
 
+from ..services.admission import AdmissionController, client_id, get_admission
+from ..services.cache import SemanticCache, get_answer_cache
 from ..services.files import FilesService
+from ..services.singleflight import SingleFlight, get_flights
+from ..utils.embeddings import CachedEmbedder, Embedder, get_embedder
+from ..utils.llm import ChatClient, get_chat_client
+from ..utils.metrics import IN_FLIGHT, REQUEST_TIMINGS, track_stream
+from ..utils.sse import event_stream
 from ..utils.store import get_store
 
 router = APIRouter(prefix="/files", tags=["files"])
@@ -9,18 +16,64 @@ router = APIRouter(prefix="/files", tags=["files"])
 
 @router.get("/query")
 async def query(
+    request: Request,
     question: str,
     temperature: float = 0.7,
     n_docs: int = 10,
     vectorstore=Depends(get_store),
+    cache: SemanticCache | None = Depends(get_answer_cache),
+    embedder: Embedder = Depends(get_embedder),
+    flights: SingleFlight | None = Depends(get_flights),
+    admission: AdmissionController | None = Depends(get_admission),
+    chat: ChatClient = Depends(get_chat_client),
 ):
-    response = await FilesService.query(question, temperature, n_docs, vectorstore)
-    return StreamingResponse(response, media_type="text/event-stream")
+    def start():
+        return FilesService.query(
+            question,
+            temperature,
+            n_docs,
+            vectorstore,
+            embedder,
+            chat,
+            cache,
+            admission,
+            client_id(request),
+        )
 
+    with IN_FLIGHT.labels("query").track_inprogress():
+        if flights is None:
+            response = await start()
+        else:
+            key = SingleFlight.key(question, n_docs, temperature)
+            response = await flights.join(key, start)
+    return StreamingResponse(
+        event_stream(track_stream(response, "query"), REQUEST_TIMINGS.get()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@router.post("/upload")
-async def upload(
-    file: UploadFile, chunk_size: int = 200, vectorstore=Depends(get_store)
+
+@router.get("/retrieve")
+async def retrieve(
+    question: str,
+    n_docs: int = 10,
+    vectorstore=Depends(get_store),
+    embedder: Embedder = Depends(get_embedder),
+):
+    with IN_FLIGHT.labels("retrieve").track_inprogress():
+        return await FilesService.retrieve(question, n_docs, vectorstore, embedder)
+
+
+@router.get("/cache")
+async def cache_stats(
+    cache: SemanticCache | None = Depends(get_answer_cache),
+    embedder: Embedder = Depends(get_embedder),
 ):
-    response = await FilesService.upload(file, chunk_size, vectorstore)
-    return {"response": response}
+    return {
+        "answers": cache.stats() if cache is not None else {"enabled": False},
+        "query_embeddings": (
+            embedder.stats()
+            if isinstance(embedder, CachedEmbedder)
+            else {"enabled": False}
+        ),
+    }
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
+
+from ..services.jobs import JobManager, get_jobs
+from ..services.uploads import UploadsService
+from ..utils.metrics import IN_FLIGHT
+
+router = APIRouter(prefix="/files", tags=["files"])
+
+
+@router.post("/upload", status_code=202)
+async def upload(
+    file: UploadFile,
+    chunk_size: int = 200,
+    jobs: JobManager = Depends(get_jobs),
+):
+    with IN_FLIGHT.labels("upload").track_inprogress():
+        job = await UploadsService.upload(file, chunk_size, jobs)
+    return job.to_dict()
+
+
+@router.get("/jobs")
+async def list_jobs(jobs: JobManager = Depends(get_jobs)):
+    return [job.to_dict() for job in jobs.jobs()]
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, jobs: JobManager = Depends(get_jobs)):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
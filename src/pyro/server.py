@@ -1,16 +1,155 @@
+"""The pyro API.
+
+``SERVER_ROLE`` selects what a process serves: ``query`` serves questions and
+retrieval, ``ingest`` serves uploads and ingestion jobs and ``all``, the
+default, serves both. Each role only imports and starts what it needs, so
+query processes never load the PDF parsing stack and ingest processes never
+load the chat model.
+"""
+
+import asyncio
 import logging
 import os
+import resource
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
-from .routers import files
+from .utils.diagnostics import DiagnosticsMiddleware, diagnostics_enabled
+from .utils.metrics import REGISTRY, MetricsMiddleware, Sampled
+from .utils.uploads import UploadLimitMiddleware
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+SERVER_ROLES = {"all": {"query", "ingest"}, "query": {"query"}, "ingest": {"ingest"}}
+SERVER_ROLE = os.environ.get("SERVER_ROLE", "all")
+if SERVER_ROLE not in SERVER_ROLES:
+    raise ValueError(
+        f"SERVER_ROLE must be one of {', '.join(SERVER_ROLES)}, not {SERVER_ROLE!r}"
+    )
+ROLES = SERVER_ROLES[SERVER_ROLE]
+
+
+async def _create_collection():
+    from .utils.embeddings import EMBEDDER, EMBEDDERS
+    from .utils.store import WEAVIATE_COLLECTION, create_class, create_client
+
+    client = await asyncio.to_thread(create_client)
+    await asyncio.to_thread(
+        create_class,
+        client,
+        os.environ.get("WEAVIATE_DROP_COLLECTION", "False") == "True",
+        WEAVIATE_COLLECTION,
+        EMBEDDERS[EMBEDDER].vectorizer,
+    )
+    return client
+
+
+@asynccontextmanager
+async def _query_lifespan(app: FastAPI):
+    from .services.admission import ADMISSION_MAX_CONCURRENT, AdmissionController
+    from .services.cache import ANSWER_CACHE_ENABLED, SemanticCache
+    from .services.singleflight import QUERY_COALESCING_ENABLED, SingleFlight
+    from .utils.embeddings import (
+        QUERY_EMBEDDING_CACHE_SIZE,
+        CachedEmbedder,
+        create_embedder,
+    )
+    from .utils.llm import ChatClient
+    from .utils.local_store import LocalStore
+    from .utils.manifest import FileManifest
+    from .utils.store import STORE_BACKEND, close_client, create_store
+
+    embedder = await asyncio.to_thread(create_embedder)
+    if QUERY_EMBEDDING_CACHE_SIZE > 0:
+        embedder = CachedEmbedder(embedder)
+    app.state.embedder = embedder
+    client = None
+    if STORE_BACKEND == "local":
+        store = await asyncio.to_thread(LocalStore, embedding=embedder)
+        app.state.vectorstore = store
+        generation = store.generation
+    else:
+        client = await _create_collection()
+        app.state.vectorstore = create_store(client, embedder)
+        generation = FileManifest(client).generation
+    app.state.answer_cache = (
+        SemanticCache(embedder, generation=generation) if ANSWER_CACHE_ENABLED else None
+    )
+    app.state.chat = ChatClient()
+    app.state.flights = SingleFlight() if QUERY_COALESCING_ENABLED else None
+    app.state.admission = (
+        AdmissionController() if ADMISSION_MAX_CONCURRENT > 0 else None
+    )
+    yield
+    await embedder.aclose()
+    await app.state.chat.aclose()
+    if client is not None:
+        close_client(client)
+
+
+@asynccontextmanager
+async def _ingest_lifespan(app: FastAPI):
+    from .services.jobs import JobManager
+    from .utils.store import STORE_BACKEND, close_client
+
+    if STORE_BACKEND != "local" and "query" not in ROLES:
+        client = await _create_collection()
+        close_client(client)
+    # With both roles in one process the answer cache is cleared right away;
+    # other query processes see the new collection generation.
+    cache = getattr(app.state, "answer_cache", None)
+    invalidate = (lambda job: cache.clear()) if cache is not None else None
+    app.state.jobs = JobManager(on_submit=invalidate, on_complete=invalidate)
+    yield
+    app.state.jobs.shutdown()
+
+
+def _max_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    import_rss = _max_rss_mib()
+    # What the other role would have set, so that its dependencies find None.
+    for name in ("embedder", "vectorstore", "answer_cache", "chat", "flights"):
+        setattr(app.state, name, None)
+    app.state.admission = app.state.jobs = None
+    async with AsyncExitStack() as stack:
+        if "query" in ROLES:
+            await stack.enter_async_context(_query_lifespan(app))
+        if "ingest" in ROLES:
+            await stack.enter_async_context(_ingest_lifespan(app))
+        logger.info(
+            "Started the %s role in %.2fs; max RSS %.1f MiB after imports, "
+            "%.1f MiB after startup",
+            SERVER_ROLE,
+            time.perf_counter() - started,
+            import_rss,
+            _max_rss_mib(),
+        )
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+if diagnostics_enabled():
+    app.add_middleware(DiagnosticsMiddleware)
 
-app.include_router(files.router)
+if "query" in ROLES:
+    from .routers import files
+
+    app.include_router(files.router)
+if "ingest" in ROLES:
+    from .routers import uploads
+
+    app.include_router(uploads.router)
 
 
 @app.get("/")
@@ -23,5 +162,65 @@ async def health():
     return {"message": "OK"}
 
 
+def _cache_stats() -> dict[str, dict]:
+    stats = {}
+    cache = getattr(app.state, "answer_cache", None)
+    if cache is not None:
+        stats["answers"] = cache.stats()
+    embedder = getattr(app.state, "embedder", None)
+    if hasattr(embedder, "stats"):
+        stats["query_embeddings"] = embedder.stats()
+    return stats
+
+
+def _cache_samples(key: str):
+    return lambda: [((name,), stats[key]) for name, stats in _cache_stats().items()]
+
+
+def _job_samples():
+    jobs = getattr(app.state, "jobs", None)
+    statuses = [job.status for job in jobs.jobs()] if jobs is not None else []
+    return [((status,), statuses.count(status)) for status in ("queued", "running")]
+
+
+for _key, _kind, _doc in [
+    ("hits", "counter", "Cache hits."),
+    ("misses", "counter", "Cache misses."),
+    ("hit_ratio", "gauge", "Share of cache lookups that hit."),
+    ("entries", "gauge", "Entries held by the cache."),
+]:
+    Sampled(f"pyro_cache_{_key}", _doc, _kind, ["cache"], _cache_samples(_key))
+Sampled(
+    "pyro_ingest_jobs_active",
+    "Ingestion jobs waiting or running.",
+    "gauge",
+    ["status"],
+    _job_samples,
+)
+
+
+def _admission_samples(key: str):
+    def samples():
+        admission = getattr(app.state, "admission", None)
+        return [((), admission.stats()[key])] if admission is not None else []
+
+    return samples
+
+
+for _key, _doc in [
+    ("active", "Queries holding a completion slot."),
+    ("queued", "Queries waiting for a completion slot."),
+    ("capacity", "Completion slots, ADMISSION_MAX_CONCURRENT."),
+]:
+    Sampled(f"pyro_admission_{_key}", _doc, "gauge", [], _admission_samples(_key))
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=int(os.environ["FASTAPI_PORT"]))
@@ -0,0 +1,200 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from collections import Counter, deque
+from collections.abc import AsyncIterator
+
+from fastapi import HTTPException, Request
+
+from ..utils.metrics import ADMISSIONS
+
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", "16"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", "10"))
+ADMISSION_PER_CLIENT = int(os.environ.get("ADMISSION_PER_CLIENT", "0"))
+ADMISSION_CLIENT_HEADER = os.environ.get("ADMISSION_CLIENT_HEADER", "")
+
+
+class Ticket:
+    """A slot held by one query; releasing it more than once is a no-op."""
+
+    def __init__(self, controller: "AdmissionController", client: str):
+        self._controller = controller
+        self.client = client
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+
+class _Held:
+    """Iterates ``tokens`` and releases ``ticket`` when the stream ends.
+
+    A plain async generator would never run its ``finally`` if it were
+    dropped before being started, e.g. when the client disconnects before the
+    response begins, so the ticket is also released when this is collected.
+    """
+
+    def __init__(self, tokens: AsyncIterator[str], ticket: Ticket):
+        self._tokens = aiter(tokens)
+        self._ticket = ticket
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            return await anext(self._tokens)
+        except BaseException:
+            self._ticket.release()
+            raise
+
+    async def aclose(self):
+        self._ticket.release()
+        if hasattr(self._tokens, "aclose"):
+            await self._tokens.aclose()
+
+    def __del__(self):
+        self._ticket.release()
+
+
+class AdmissionController:
+    """Bounds the number of queries generating completions at once.
+
+    Up to ``max_concurrent`` queries run; up to ``max_queue`` more wait at
+    most ``max_wait`` seconds for a slot. Beyond that, queries are refused
+    with a 429 and a ``Retry-After`` estimated from recent completion times.
+    With ``per_client``, a client can hold at most that many slots and queue
+    at most that many queries, and freed slots go to the waiting client
+    holding the fewest slots.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        per_client: int = ADMISSION_PER_CLIENT,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.per_client = per_client
+        self.active = 0
+        self._active_by_client: Counter[str] = Counter()
+        self._waiting: dict[str, deque[tuple[int, asyncio.Future]]] = {}
+        self._order = itertools.count()
+        self.queued = 0
+        self._hold_seconds = 0.0
+
+    def _has_room(self, client: str) -> bool:
+        return self.active < self.max_concurrent and (
+            not self.per_client or self._active_by_client[client] < self.per_client
+        )
+
+    def _start(self, client: str) -> Ticket:
+        self.active += 1
+        self._active_by_client[client] += 1
+        return Ticket(self, client)
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a slot frees up for a query arriving now."""
+        hold = self._hold_seconds or self.max_wait
+        return max(1, math.ceil(hold * (self.queued + 1) / self.max_concurrent))
+
+    def _reject(self, reason: str, detail: str):
+        ADMISSIONS.labels(reason).inc()
+        raise HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def admit(self, client: str) -> Ticket:
+        """Wait for a slot for ``client`` or raise a 429."""
+        if self._has_room(client):
+            ADMISSIONS.labels("admitted").inc()
+            return self._start(client)
+        if self.queued >= self.max_queue:
+            self._reject("queue_full", "Too many queries, try again later")
+        if self.per_client and len(self._waiting.get(client, ())) >= self.per_client:
+            self._reject("client_limit", "Too many queries from this client")
+        waiting = self._waiting.setdefault(client, deque())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (next(self._order), future)
+        waiting.append(entry)
+        self.queued += 1
+        try:
+            async with asyncio.timeout(self.max_wait):
+                return await future
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as the wait ended.
+                future.result().release()
+            else:
+                future.cancel()
+                waiting.remove(entry)
+                self.queued -= 1
+                if not waiting:
+                    del self._waiting[client]
+            if isinstance(e, TimeoutError):
+                self._reject("timeout", "Timed out waiting for capacity")
+            raise
+
+    def _release(self, ticket: Ticket):
+        self.active -= 1
+        self._active_by_client[ticket.client] -= 1
+        if not self._active_by_client[ticket.client]:
+            del self._active_by_client[ticket.client]
+        held = time.monotonic() - ticket.started
+        self._hold_seconds = (
+            0.8 * self._hold_seconds + 0.2 * held if self._hold_seconds else held
+        )
+        self._grant()
+
+    def _grant(self):
+        while True:
+            ready = [client for client in self._waiting if self._has_room(client)]
+            if not ready:
+                return
+            client = min(
+                ready,
+                key=lambda c: (self._active_by_client[c], self._waiting[c][0][0]),
+            )
+            _, future = self._waiting[client].popleft()
+            if not self._waiting[client]:
+                del self._waiting[client]
+            self.queued -= 1
+            if not future.done():
+                ADMISSIONS.labels("queued").inc()
+                future.set_result(self._start(client))
+
+    @staticmethod
+    def hold(tokens: AsyncIterator[str], ticket: Ticket) -> AsyncIterator[str]:
+        return _Held(tokens, ticket)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "capacity": self.max_concurrent,
+            "clients": len(self._active_by_client),
+        }
+
+
+def client_id(request: Request) -> str:
+    if ADMISSION_CLIENT_HEADER:
+        value = request.headers.get(ADMISSION_CLIENT_HEADER)
+        if value:
+            return value.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def get_admission(request: Request) -> AdmissionController | None:
+    return request.app.state.admission
@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+
+import numpy as np
+from fastapi import Request
+
+from ..utils.embeddings import Embedder
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "True") == "True"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_MAX_CHARS = int(os.environ.get("ANSWER_CACHE_MAX_CHARS", "4000000"))
+ANSWER_CACHE_TEMPERATURE_STEP = float(
+    os.environ.get("ANSWER_CACHE_TEMPERATURE_STEP", "0.25")
+)
+ANSWER_CACHE_SYNC_INTERVAL = float(os.environ.get("ANSWER_CACHE_SYNC_INTERVAL", "5"))
+
+# The generation before it was first read; a missing generation reads as None.
+_UNSET = object()
+
+
+@dataclass
+class _Entry:
+    bucket: tuple[int, int]
+    vector: np.ndarray
+    chunks: list[str]
+    size: int
+    expires_at: float
+
+
+class SemanticCache:
+    """Answer cache keyed by question embedding similarity.
+
+    Entries are grouped in buckets of ``n_docs`` and temperature; a lookup hits
+    when the cosine similarity to a live entry in the same bucket reaches
+    ``threshold``. Entries expire after ``ttl`` seconds and the least recently
+    used ones are evicted once ``max_entries`` or ``max_chars`` is exceeded.
+
+    ``generation`` returns a token that changes whenever the collection does.
+    It is checked at most every ``sync_interval`` seconds and the cache is
+    cleared when it changed, so documents ingested by other processes are
+    picked up.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        max_chars: int = ANSWER_CACHE_MAX_CHARS,
+        temperature_step: float = ANSWER_CACHE_TEMPERATURE_STEP,
+        generation: Callable[[], str | None] | None = None,
+        sync_interval: float = ANSWER_CACHE_SYNC_INTERVAL,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.temperature_step = temperature_step
+        self.sync_interval = sync_interval
+        self._generation = generation
+        self._seen_generation = _UNSET
+        self._next_sync = 0.0
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._ids = itertools.count()
+        self._chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _bucket(self, n_docs: int, temperature: float) -> tuple[int, int]:
+        return n_docs, int(temperature // self.temperature_step)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key)
+        self._chars -= entry.size
+
+    def get(self, vector, n_docs: int, temperature: float) -> list[str] | None:
+        bucket = self._bucket(n_docs, temperature)
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            self._remove(key)
+        candidates = [(k, e) for k, e in self._entries.items() if e.bucket == bucket]
+        if candidates:
+            query = self._normalize(vector)
+            scores = np.stack([e.vector for _, e in candidates]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                key, entry = candidates[best]
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.chunks
+        self.misses += 1
+        return None
+
+    async def _sync(self):
+        if self._generation is None or time.monotonic() < self._next_sync:
+            return
+        self._next_sync = time.monotonic() + self.sync_interval
+        try:
+            generation = await asyncio.to_thread(self._generation)
+        except Exception:
+            logger.exception("Could not read the collection generation")
+            self.errors += 1
+            return
+        if generation != self._seen_generation:
+            if self._seen_generation is not _UNSET:
+                self.clear()
+            self._seen_generation = generation
+
+    async def lookup(
+        self, question: str, n_docs: int, temperature: float
+    ) -> tuple[list[float] | None, list[str] | None]:
+        """Embed ``question`` and return its vector and any cached answer."""
+        await self._sync()
+        try:
+            vector = await self.embedder.aembed_query(question)
+        except Exception:
+            logger.exception("Could not embed question, bypassing the answer cache")
+            self.errors += 1
+            return None, None
+        return vector, self.get(vector, n_docs, temperature)
+
+    def put(self, vector, n_docs: int, temperature: float, chunks: list[str]):
+        size = sum(len(chunk) for chunk in chunks)
+        if size > self.max_chars:
+            return
+        self._entries[next(self._ids)] = _Entry(
+            bucket=self._bucket(n_docs, temperature),
+            vector=self._normalize(vector),
+            chunks=chunks,
+            size=size,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._chars += size
+        while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._chars = 0
+        self.invalidations += 1
+
+    async def record(
+        self, tokens: AsyncIterator[str], vector, n_docs: int, temperature: float
+    ) -> AsyncIterator[str]:
+        """Pass ``tokens`` through and cache them once the stream completes."""
+        chunks = []
+        generation = self.invalidations
+        async for token in tokens:
+            chunks.append(token)
+            yield token
+        if generation == self.invalidations:
+            self.put(vector, n_docs, temperature, chunks)
+
+    @staticmethod
+    async def replay(chunks: list[str]) -> AsyncIterator[str]:
+        for chunk in chunks:
+            yield chunk
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "chars": self._chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+def get_answer_cache(request: Request) -> SemanticCache | None:
+    return request.app.state.answer_cache
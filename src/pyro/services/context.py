@@ -0,0 +1,130 @@
+"""Context assembly between retrieval and the LLM.
+
+Retrieved chunks are de-duplicated with an MMR-style diversity cut, adjacent
+chunks of the same file are merged back together using their ``start_index``
+and the result is packed into a token budget in relevance order.
+"""
+
+import os
+
+import numpy as np
+from langchain.schema import Document
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_CHARS_PER_TOKEN = int(os.environ.get("CONTEXT_CHARS_PER_TOKEN", "4"))
+CONTEXT_MMR_LAMBDA = float(os.environ.get("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_THRESHOLD = float(
+    os.environ.get("CONTEXT_DUPLICATE_THRESHOLD", "0.95")
+)
+CONTEXT_MERGE_GAP = int(os.environ.get("CONTEXT_MERGE_GAP", "2"))
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of prompt tokens of ``text``."""
+    return -(-len(text) // CONTEXT_CHARS_PER_TOKEN)
+
+
+def select_diverse(
+    docs: list[Document],
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    threshold: float = CONTEXT_DUPLICATE_THRESHOLD,
+) -> list[Document]:
+    """Order ``docs`` by maximal marginal relevance and drop near-duplicates."""
+    additional = [doc.metadata.get("_additional") or {} for doc in docs]
+    if not docs or any("vector" not in extra for extra in additional):
+        seen = set()
+        unique = []
+        for doc in docs:
+            key = " ".join(doc.page_content.split()).lower()
+            if key not in seen:
+                seen.add(key)
+                unique.append(doc)
+        return unique
+
+    vectors = np.array([extra["vector"] for extra in additional], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+    if all("distance" in extra for extra in additional):
+        relevance = 1 - np.array([extra["distance"] for extra in additional])
+    else:
+        relevance = np.linspace(1, 0.5, len(docs))
+
+    remaining = list(range(len(docs)))
+    selected: list[int] = []
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(scores))
+        index = remaining.pop(best)
+        if redundancy[best] < threshold:
+            selected.append(index)
+    return [docs[i] for i in selected]
+
+
+def merge_adjacent(docs: list[Document], gap: int = CONTEXT_MERGE_GAP):
+    """Merge overlapping or adjacent chunks of the same file.
+
+    Merged chunks take the rank of their most relevant part.
+    """
+    runs: list[tuple[int, Document]] = []
+    by_file: dict[str, list[tuple[int, Document]]] = {}
+    for rank, doc in enumerate(docs):
+        if doc.metadata.get("file") is None or doc.metadata.get("start_index") is None:
+            runs.append((rank, _chunk(doc, doc.page_content, None)))
+        else:
+            by_file.setdefault(doc.metadata["file"], []).append((rank, doc))
+
+    for chunks in by_file.values():
+        chunks.sort(key=lambda item: item[1].metadata["start_index"])
+        rank, current = chunks[0]
+        text, start = current.page_content, current.metadata["start_index"]
+        for next_rank, doc in chunks[1:]:
+            next_start = doc.metadata["start_index"]
+            end = start + len(text)
+            if next_start <= end + gap:
+                overlap = max(end - next_start, 0)
+                separator = "" if next_start <= end else "\n"
+                text += separator + doc.page_content[overlap:]
+                rank = min(rank, next_rank)
+                continue
+            runs.append((rank, _chunk(current, text, start)))
+            rank, current = next_rank, doc
+            text, start = doc.page_content, next_start
+        runs.append((rank, _chunk(current, text, start)))
+
+    return [doc for _, doc in sorted(runs, key=lambda item: item[0])]
+
+
+def _chunk(doc: Document, text: str, start: int | None) -> Document:
+    metadata = {**doc.metadata, "start_index": start}
+    metadata.pop("_additional", None)
+    return Document(page_content=text, metadata=metadata)
+
+
+def fit_budget(docs: list[Document], budget: int = CONTEXT_TOKEN_BUDGET):
+    """Keep documents in order until ``budget`` tokens are used."""
+    packed = []
+    used = 0
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        if used + tokens > budget:
+            if not packed:
+                packed.append(
+                    Document(
+                        page_content=doc.page_content[
+                            : budget * CONTEXT_CHARS_PER_TOKEN
+                        ],
+                        metadata=doc.metadata,
+                    )
+                )
+            break
+        packed.append(doc)
+        used += tokens
+    return packed
+
+
+def pack_context(docs: list[Document], budget: int = CONTEXT_TOKEN_BUDGET):
+    return fit_budget(merge_adjacent(select_diverse(docs)), budget)
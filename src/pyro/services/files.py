@@ -1,86 +1,165 @@
-import io
-import os
+import asyncio
+import time
+from collections.abc import AsyncIterator
 
-from langchain import LLMChain
-from langchain.chains import RetrievalQA, StuffDocumentsChain
-from langchain.chat_models import AzureChatOpenAI
 from langchain.prompts import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
     PromptTemplate,
 )
-from langchain.schema import HumanMessage, SystemMessage
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores.weaviate import Weaviate
-from unstructured.partition.pdf import partition_pdf
+from langchain.schema import Document, HumanMessage, SystemMessage, format_document
+from langchain.schema.vectorstore import VectorStore
 
+from ..utils.embeddings import Embedder
+from ..utils.llm import ChatClient
+from ..utils.metrics import TOKENS, observe_stage, stage
+from .admission import AdmissionController
+from .cache import SemanticCache
+from .context import count_tokens, pack_context
 
-class FilesService:
-    @staticmethod
-    def _openai_streamer(retr_qa: RetrievalQA, text: str):
-        yield from retr_qa.run(text)
 
-    @staticmethod
-    async def query(question, temperature, n_docs, vectorstore: Weaviate):
-        llm = AzureChatOpenAI(
-            deployment_name=os.environ.get("OPENAI_DEPLOYMENT_NAME"),
-            openai_api_base=os.environ.get("OPENAI_API_BASE"),
-            openai_api_version=os.environ.get("OPENAI_API_VERSION", "2024-02-01"),
-            openai_api_key=os.environ.get("OPENAI_API_KEY"),
-            streaming=True,
-            temperature=temperature,
-        )
-        messages = [
-            SystemMessage(
-                content="You are a world class algorithm to answer questions related to the Programming Language \
-                Python. Remember you are a  algorithm to answer questions or generate code related to the Programming \
-                Language Python only. You cannot answer questions related to other topics."
-            ),
-            HumanMessage(
-                content="Answer question using only information contained in the following context: "
-            ),
-            HumanMessagePromptTemplate.from_template("{context}"),
-            HumanMessage(
-                content="Tips: If you can't find a relevant answer in the context, then try to broaden the context and \
-                  answer but dont go to beyond! If The provided context does not contain any information relevant to \
-                  the question, please respond with I don't know or I can't answer this question."
+def _build_prompt() -> ChatPromptTemplate:
+    messages = [
+        SystemMessage(
+            content="You are a world class algorithm to answer questions related to the Programming Language \
+            Python. Remember you are a  algorithm to answer questions or generate code related to the Programming \
+            Language Python only. You cannot answer questions related to other topics."
+        ),
+        HumanMessage(
+            content="Answer question using only information contained in the following context: "
+        ),
+        HumanMessagePromptTemplate.from_template("{context}"),
+        HumanMessage(
+            content="Tips: If you can't find a relevant answer in the context, then try to broaden the context and \
+              answer but dont go to beyond! If The provided context does not contain any information relevant to \
+              the question, please respond with I don't know or I can't answer this question."
+        ),
+        HumanMessagePromptTemplate.from_template("Question: {question}"),
+    ]
+    return ChatPromptTemplate(messages=messages)
 
-            ),
-            HumanMessagePromptTemplate.from_template("Question: {question}"),
-        ]
-        prompt = ChatPromptTemplate(messages=messages)
 
-        qa_chain = LLMChain(llm=llm, prompt=prompt)
-        doc_prompt = PromptTemplate(
-            template="Content: {page_content}",
-            input_variables=["page_content"],
-        )
-        final_qa_chain = StuffDocumentsChain(
-            llm_chain=qa_chain,
-            document_variable_name="context",
-            document_prompt=doc_prompt,
-        )
-        retrieval_qa = RetrievalQA(
-            retriever=vectorstore.as_retriever(search_kwargs={"k": n_docs}),
-            combine_documents_chain=final_qa_chain,
+PROMPT = _build_prompt()
+DOC_PROMPT = PromptTemplate(
+    template="Content: {page_content}",
+    input_variables=["page_content"],
+)
+
+
+class FilesService:
+    @staticmethod
+    async def _openai_streamer(
+        chat: ChatClient, docs: list[Document], question: str, temperature: float
+    ) -> AsyncIterator[str]:
+        with stage("query", "prompt"):
+            context = "\n\n".join(format_document(doc, DOC_PROMPT) for doc in docs)
+            messages = PROMPT.format_messages(context=context, question=question)
+        TOKENS.labels("prompt").inc(
+            sum(count_tokens(message.content) for message in messages)
         )
-        return FilesService._openai_streamer(retrieval_qa, question)
+        start = time.perf_counter()
+        first = True
+        with stage("query", "llm"):
+            async for token in chat.astream(messages, temperature):
+                if first:
+                    observe_stage(
+                        "query", "llm_first_token", time.perf_counter() - start
+                    )
+                    first = False
+                TOKENS.labels("completion").inc()
+                yield token
 
     @staticmethod
-    async def upload(file, chunk_size, vectorstore: Weaviate):
-        data = await file.read()
-        elements = partition_pdf(file=io.BytesIO(data))
-        text = [ele.text for ele in elements]
+    async def _search(
+        vector: list[float],
+        n_docs: int,
+        vectorstore: VectorStore,
+        additional: list[str],
+        pipeline: str = "query",
+    ) -> list[Document]:
+        with stage(pipeline, "search"):
+            return await asyncio.to_thread(
+                vectorstore.similarity_search_by_vector,
+                vector,
+                k=n_docs,
+                additional=additional,
+            )
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=20,
-            length_function=len,
-            add_start_index=True,
+    @staticmethod
+    async def retrieve(
+        question, n_docs, vectorstore: VectorStore, embedder: Embedder
+    ) -> list[dict]:
+        """The top ``n_docs`` chunks for ``question`` with their similarity."""
+        with stage("retrieve", "embed"):
+            vector = await embedder.aembed_query(question)
+        docs = await FilesService._search(
+            vector, n_docs, vectorstore, ["id", "distance"], "retrieve"
         )
+        chunks = []
+        for doc in docs:
+            extra = doc.metadata.get("_additional") or {}
+            distance = extra.get("distance")
+            chunks.append(
+                {
+                    "id": extra.get("id"),
+                    "score": None if distance is None else 1 - distance,
+                    "file": doc.metadata.get("file"),
+                    "start_index": doc.metadata.get("start_index"),
+                    "content": doc.page_content,
+                }
+            )
+        return chunks
 
-        docs = text_splitter.create_documents(
-            ["\n".join(text)], metadatas=[{"file": f"{file.filename}"}]
+    @staticmethod
+    async def query(
+        question,
+        temperature,
+        n_docs,
+        vectorstore: VectorStore,
+        embedder: Embedder,
+        chat: ChatClient,
+        cache: SemanticCache | None = None,
+        admission: AdmissionController | None = None,
+        client: str = "",
+    ):
+        vector = None
+        if cache is not None:
+            with stage("query", "cache_lookup"):
+                vector, chunks = await cache.lookup(question, n_docs, temperature)
+            if chunks is not None:
+                return cache.replay(chunks)
+        args = (question, temperature, n_docs, vectorstore, embedder, chat, cache)
+        if admission is None:
+            return await FilesService._answer(*args, vector)
+        with stage("query", "admission"):
+            ticket = await admission.admit(client)
+        try:
+            tokens = await FilesService._answer(*args, vector)
+        except BaseException:
+            ticket.release()
+            raise
+        return admission.hold(tokens, ticket)
+
+    @staticmethod
+    async def _answer(
+        question,
+        temperature,
+        n_docs,
+        vectorstore: VectorStore,
+        embedder: Embedder,
+        chat: ChatClient,
+        cache: SemanticCache | None,
+        vector: list[float] | None,
+    ) -> AsyncIterator[str]:
+        if vector is None:
+            with stage("query", "embed"):
+                vector = await embedder.aembed_query(question)
+        docs = await FilesService._search(
+            vector, n_docs, vectorstore, ["vector", "distance"]
         )
-        response = vectorstore.add_documents(docs)
-        return response
+        with stage("query", "context"):
+            docs = pack_context(docs)
+        tokens = FilesService._openai_streamer(chat, docs, question, temperature)
+        if cache is not None and vector is not None:
+            tokens = cache.record(tokens, vector, n_docs, temperature)
+        return tokens
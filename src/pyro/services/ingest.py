@@ -0,0 +1,220 @@
+"""Ingestion work executed inside the process-pool workers.
+
+Everything in this module runs in a child process, so progress is reported
+back to the API process through the queue handed to :func:`init_worker`.
+"""
+
+import itertools
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from langchain.schema import Document
+
+from ..utils.chunking import StreamingSplitter
+from ..utils.embeddings import EMBEDDER, EMBEDDERS, create_embedder
+from ..utils.local_store import LocalBatchWriter, LocalFileManifest, LocalStore
+from ..utils.manifest import ChunkIds, FileManifest
+from ..utils.parse_cache import PARSE_CACHE_ENABLED, ParseCache
+from ..utils.pdf import count_pages, iter_pages
+from ..utils.store import STORE_BACKEND, create_client
+from ..utils.writer import WEAVIATE_BATCH_WORKERS, BatchWriter
+
+INGEST_PAGE_BATCH = int(os.environ.get("INGEST_PAGE_BATCH", "10"))
+INGEST_DIFF_BATCH = int(os.environ.get("INGEST_DIFF_BATCH", "200"))
+
+_progress = None
+_client = None
+_local_store = None
+_parse_cache = None
+_embedder = None
+
+
+def init_worker(progress_queue):
+    global _progress, _client, _local_store, _parse_cache, _embedder
+    _progress = progress_queue
+    if STORE_BACKEND == "local":
+        _local_store = LocalStore()
+    else:
+        _client = create_client(pool_size=2 * WEAVIATE_BATCH_WORKERS)
+    _parse_cache = ParseCache() if PARSE_CACHE_ENABLED else None
+    if _local_store is not None or EMBEDDERS[EMBEDDER].vectorizer is None:
+        _embedder = create_embedder()
+
+
+def _report(job_id: str, **update):
+    if _progress is not None:
+        _progress.put((job_id, update))
+
+
+@contextmanager
+def _stage(job_id: str, name: str):
+    _report(job_id, stage=name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _report(job_id, timings={name: round(time.perf_counter() - start, 4)})
+
+
+class _Pipeline:
+    """Streams one file through parse → chunk → diff into the batch writer.
+
+    Page batches are parsed and chunked only as fast as the writer consumes
+    objects, so memory stays bounded by a page batch and the first chunks are
+    searchable long before the last page is read.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        path: str,
+        file_hash: str,
+        filename: str,
+        chunk_size: int,
+        manifest: FileManifest,
+        existing: dict[str, int],
+    ):
+        self.job_id = job_id
+        self.path = path
+        self.file_hash = file_hash
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.manifest = manifest
+        self.existing = existing
+        self.ids = ChunkIds(filename)
+        self.seen: set[str] = set()
+        self.chunks = 0
+        self.unchanged = 0
+        self.timings = {"partition": 0.0, "split": 0.0, "diff": 0.0, "embed": 0.0}
+
+    def _timed(self, name: str, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def _docs(self) -> Iterator[Document]:
+        splitter = StreamingSplitter(self.chunk_size, metadata={"file": self.filename})
+        if _parse_cache is not None:
+            cached, pages = _parse_cache.pages(
+                self.path, self.file_hash, INGEST_PAGE_BATCH
+            )
+            _report(self.job_id, parse_cached=cached)
+        else:
+            pages = iter_pages(self.path, INGEST_PAGE_BATCH)
+        while batch := self._timed("partition", next, pages, None):
+            number, texts = batch
+            yield from self._timed("split", splitter.feed, texts)
+            _report(self.job_id, pages_parsed=number)
+        yield from self._timed("split", splitter.flush)
+
+    def _diff(self, docs: list[Document]):
+        new, moved = [], []
+        for doc in docs:
+            _id = self.ids(doc)
+            self.seen.add(_id)
+            if _id not in self.existing:
+                new.append((doc, _id))
+            elif self.existing[_id] != doc.metadata["start_index"]:
+                moved.append((doc, _id))
+            else:
+                self.unchanged += 1
+        vectors = self.manifest.vectors([_id for _, _id in moved]) if moved else {}
+        reused = []
+        for doc, _id in moved:
+            if vectors.get(_id) is None:
+                new.append((doc, _id))
+            else:
+                reused.append((doc, _id, vectors[_id]))
+        return new, reused
+
+    def _embed(self, docs: list[Document]) -> list[list[float] | None]:
+        if _embedder is None or not docs:
+            return [None] * len(docs)
+        texts = [doc.page_content for doc in docs]
+        return self._timed("embed", _embedder.embed_documents, texts)
+
+    def objects(self) -> Iterator[tuple[Document, str, list[float] | None]]:
+        docs = self._docs()
+        while batch := list(itertools.islice(docs, INGEST_DIFF_BATCH)):
+            new, reused = self._timed("diff", self._diff, batch)
+            vectors = self._embed([doc for doc, _ in new])
+            self.chunks += len(batch)
+            _report(
+                self.job_id,
+                chunks_total=self.chunks,
+                chunks_unchanged=self.unchanged,
+            )
+            yield from (
+                (doc, _id, v) for (doc, _id), v in zip(new, vectors, strict=True)
+            )
+            yield from reused
+
+    def stale(self) -> list[str]:
+        return list(self.existing.keys() - self.seen)
+
+
+def ingest_pdf(job_id: str, *args) -> dict:
+    try:
+        return _ingest_pdf(job_id, *args)
+    finally:
+        # Always the job's last message: the API process waits for it before
+        # finishing the job, so no progress or timings arrive afterwards.
+        _report(job_id, done=True)
+
+
+def _ingest_pdf(
+    job_id: str, path: str, file_hash: str, filename: str, chunk_size: int
+) -> dict:
+    _report(job_id, status="running", started_at=time.time())
+    if _local_store is not None:
+        manifest = LocalFileManifest(_local_store)
+    else:
+        manifest = FileManifest(_client)
+    if manifest.is_current(filename, file_hash, chunk_size):
+        return {"unchanged": True}
+
+    _report(job_id, pages_total=count_pages(path))
+    with _stage(job_id, "lookup"):
+        existing = manifest.existing_chunks(filename)
+
+    pipeline = _Pipeline(
+        job_id, path, file_hash, filename, chunk_size, manifest, existing
+    )
+
+    def on_progress(written: int, failed: int):
+        _report(job_id, chunks_indexed=written, chunks_failed=failed)
+
+    if _local_store is not None:
+        writer = LocalBatchWriter(_local_store, on_progress=on_progress)
+    else:
+        writer = BatchWriter(_client, on_progress=on_progress)
+    _report(job_id, stage="index")
+    start = time.perf_counter()
+    writer.write(pipeline.objects())
+    elapsed = time.perf_counter() - start
+    timings = {
+        **pipeline.timings,
+        "index": elapsed - sum(pipeline.timings.values()),
+    }
+    _report(job_id, timings={k: round(v, 4) for k, v in timings.items()})
+
+    stale = pipeline.stale()
+    with _stage(job_id, "delete"):
+        manifest.delete(stale)
+    if not writer.failed:
+        manifest.mark(filename, file_hash, chunk_size, pipeline.chunks)
+    if writer.written or stale:
+        manifest.bump_generation()
+
+    return {
+        "chunks_total": pipeline.chunks,
+        "chunks_unchanged": pipeline.unchanged,
+        "chunks_indexed": writer.written,
+        "chunks_failed": writer.failed,
+        "chunks_deleted": len(stale),
+        "errors": writer.errors,
+    }
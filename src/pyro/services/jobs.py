@@ -0,0 +1,193 @@
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from fastapi import Request
+
+from ..utils.metrics import CHUNKS, ERRORS, JOBS, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(
+    os.environ.get("INGEST_WORKERS", max(1, (os.cpu_count() or 2) // 2))
+)
+INGEST_JOBS_HISTORY = int(os.environ.get("INGEST_JOBS_HISTORY", "1000"))
+INGEST_DRAIN_TIMEOUT = float(os.environ.get("INGEST_DRAIN_TIMEOUT", "10"))
+
+
+@dataclass
+class Job:
+    id: str
+    filename: str
+    chunk_size: int
+    status: str = "queued"
+    stage: str | None = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    file_hash: str | None = None
+    unchanged: bool = False
+    parse_cached: bool = False
+    pages_total: int = 0
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_unchanged: int = 0
+    chunks_indexed: int = 0
+    chunks_failed: int = 0
+    chunks_deleted: int = 0
+    errors: list[dict] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def update(self, update: dict):
+        for key, value in update.items():
+            if key == "timings":
+                self.timings.update(value)
+            else:
+                setattr(self, key, value)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _init_worker(progress):
+    # ingest, and the parsing and indexing stack behind it, is only imported
+    # in the worker processes, never in the API process submitting the jobs.
+    from . import ingest
+
+    ingest.init_worker(progress)
+
+
+def _ingest_pdf(*args) -> dict:
+    from . import ingest
+
+    return ingest.ingest_pdf(*args)
+
+
+def _record(job: Job):
+    JOBS.labels(job.status).inc()
+    if job.status == "failed":
+        ERRORS.labels("ingest", job.stage or "unknown").inc()
+    for name, seconds in job.timings.items():
+        STAGE_SECONDS.labels("ingest", name).observe(seconds)
+    for result in ("indexed", "unchanged", "failed", "deleted"):
+        CHUNKS.labels(result).inc(getattr(job, f"chunks_{result}"))
+
+
+class JobManager:
+    """Runs PDF ingestion on a process pool and tracks job progress."""
+
+    def __init__(
+        self,
+        max_workers: int = INGEST_WORKERS,
+        on_submit: Callable[[Job], None] | None = None,
+        on_complete: Callable[[Job], None] | None = None,
+    ):
+        self._on_submit = on_submit
+        self._on_complete = on_complete
+        context = multiprocessing.get_context("spawn")
+        self._progress = context.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._progress,),
+        )
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._drained: dict[str, asyncio.Event] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._loop = asyncio.get_running_loop()
+        self._drainer = threading.Thread(target=self._drain, daemon=True)
+        self._drainer.start()
+
+    def _drain(self):
+        # Jobs are only mutated on the event loop, which also serializes them.
+        while (message := self._progress.get()) is not None:
+            with contextlib.suppress(RuntimeError):
+                self._loop.call_soon_threadsafe(self._apply, *message)
+
+    def _apply(self, job_id: str, update: dict):
+        job = self._jobs.get(job_id)
+        if job is None or job.finished_at is not None:
+            return
+        if update.pop("done", False):
+            if (drained := self._drained.get(job_id)) is not None:
+                drained.set()
+            return
+        job.update(update)
+
+    def _evict(self):
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in ("completed", "failed")
+        ]
+        for job_id in finished[: max(0, len(self._jobs) - INGEST_JOBS_HISTORY)]:
+            del self._jobs[job_id]
+
+    async def _run(self, job: Job, path: str, *args):
+        drained = self._drained[job.id] = asyncio.Event()
+        try:
+            result = await self._loop.run_in_executor(
+                self._executor, _ingest_pdf, job.id, path, *args
+            )
+        except Exception as e:
+            logger.exception("Ingestion job %s failed", job.id)
+            update = {"status": "failed", "error": str(e)}
+        else:
+            update = {**result, "status": "completed"}
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+        # The result can overtake the progress messages, so wait for the
+        # worker's last one; it never comes if the worker process died.
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(drained.wait(), INGEST_DRAIN_TIMEOUT)
+        del self._drained[job.id]
+        job.update({**update, "stage": None, "finished_at": time.time()})
+        _record(job)
+        if self._on_complete is not None:
+            self._on_complete(job)
+
+    def submit(self, path: str, file_hash: str, filename: str, chunk_size: int) -> Job:
+        """Queue the PDF spooled at ``path``; the job deletes it when done."""
+        job = Job(
+            id=uuid.uuid4().hex,
+            filename=filename,
+            chunk_size=chunk_size,
+            file_hash=file_hash,
+        )
+        self._jobs[job.id] = job
+        self._evict()
+        if self._on_submit is not None:
+            self._on_submit(job)
+        task = asyncio.create_task(
+            self._run(job, path, file_hash, filename, chunk_size)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[Job]:
+        return list(self._jobs.values())
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._progress.put(None)
+        self._drainer.join(timeout=5)
+
+
+def get_jobs(request: Request) -> JobManager:
+    return request.app.state.jobs
@@ -0,0 +1,160 @@
+import asyncio
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from fastapi import Request
+
+from ..utils.embeddings import CachedEmbedder
+from ..utils.metrics import COALESCED
+
+QUERY_COALESCING_ENABLED = os.environ.get("QUERY_COALESCING_ENABLED", "True") == "True"
+
+
+class _Flight:
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.tokens: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """Runs identical concurrent questions once and fans the answer out.
+
+    The first request for a key starts the pipeline; requests with the same
+    key that arrive while it is running attach to it. The tokens are buffered
+    for the lifetime of the flight, so every subscriber streams the whole
+    answer from the start however late it joined. The pipeline is cancelled
+    once every subscriber has gone away.
+    """
+
+    def __init__(self):
+        self._flights: dict[tuple, _Flight] = {}
+
+    @staticmethod
+    def key(question: str, n_docs: int, temperature: float) -> tuple:
+        return CachedEmbedder.normalize(question), n_docs, temperature
+
+    async def join(
+        self, key: tuple, start: Callable[[], Awaitable[AsyncIterator[str]]]
+    ) -> AsyncIterator[str]:
+        """Subscribe to the flight for ``key``, starting it with ``start``.
+
+        Errors raised by ``start`` reach every request waiting on the flight,
+        so they are reported before the response starts as they would be
+        without coalescing.
+        """
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                return await self._lead(key, start)
+            COALESCED.labels().inc()
+            await flight.ready.wait()
+            if flight.task is None:
+                if isinstance(flight.error, asyncio.CancelledError):
+                    # The leading request went away before its pipeline started.
+                    continue
+                raise flight.error
+            flight.subscribers += 1
+            return _Subscription(self, key, flight)
+
+    async def _lead(self, key: tuple, start) -> AsyncIterator[str]:
+        flight = self._flights[key] = _Flight()
+        try:
+            tokens = await start()
+        except BaseException as e:
+            flight.error = e
+            del self._flights[key]
+            flight.ready.set()
+            raise
+        flight.task = asyncio.create_task(self._pump(flight, tokens))
+        # A done callback rather than a finally in _pump, which would not run
+        # if the task were cancelled before it started.
+        flight.task.add_done_callback(lambda task: self._finish(key, flight, task))
+        flight.subscribers += 1
+        flight.ready.set()
+        return _Subscription(self, key, flight)
+
+    async def _pump(self, flight: _Flight, tokens: AsyncIterator[str]):
+        try:
+            async for token in tokens:
+                flight.tokens.append(token)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+
+    def _finish(self, key: tuple, flight: _Flight, task: asyncio.Task):
+        if task.cancelled():
+            flight.error = asyncio.CancelledError()
+        flight.done = True
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.notify()
+
+    def _leave(self, key: tuple, flight: _Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # Later requests for the key start a new flight instead of joining
+            # the one being cancelled.
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.task.cancel()
+
+
+class _Subscription:
+    """Streams a flight's tokens from the start to one request.
+
+    Like ``admission._Held``, it leaves the flight when the stream ends, fails
+    or is closed, and also when it is collected without having been started,
+    e.g. when the client disconnects before the response begins.
+    """
+
+    def __init__(self, flights: SingleFlight, key: tuple, flight: _Flight):
+        self._flights = flights
+        self._key = key
+        self._flight = flight
+        self._sent = 0
+        self._left = False
+
+    def _leave(self):
+        if not self._left:
+            self._left = True
+            self._flights._leave(self._key, self._flight)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        flight = self._flight
+        try:
+            while self._sent >= len(flight.tokens):
+                if flight.done:
+                    if isinstance(flight.error, asyncio.CancelledError):
+                        # Only the pipeline was cancelled, not this request.
+                        raise RuntimeError("The answer was cancelled")
+                    if flight.error is not None:
+                        raise flight.error
+                    raise StopAsyncIteration
+                await flight.changed.wait()
+        except BaseException:
+            self._leave()
+            raise
+        self._sent += 1
+        return flight.tokens[self._sent - 1]
+
+    async def aclose(self):
+        self._leave()
+
+    def __del__(self):
+        self._leave()
+
+
+def get_flights(request: Request) -> SingleFlight | None:
+    return request.app.state.flights
@@ -0,0 +1,13 @@
+from fastapi import UploadFile
+
+from ..utils.metrics import stage
+from ..utils.uploads import spool_upload
+from .jobs import Job, JobManager
+
+
+class UploadsService:
+    @staticmethod
+    async def upload(file: UploadFile, chunk_size: int, jobs: JobManager) -> Job:
+        with stage("upload", "spool"):
+            path, file_hash = await spool_upload(file)
+        return jobs.submit(path, file_hash, file.filename, chunk_size)
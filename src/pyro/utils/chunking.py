@@ -0,0 +1,49 @@
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+class StreamingSplitter:
+    """Chunks text that arrives in pieces, such as a PDF read page by page.
+
+    The pieces are treated as one ``"\\n"``-joined text. Everything up to the
+    last chunk is emitted on every :meth:`feed`; the last chunk is kept and
+    re-split with the next piece, so chunks and their overlap continue across
+    piece boundaries and ``start_index`` refers to the whole text.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int = 20, metadata=None):
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            add_start_index=True,
+        )
+        self._metadata = metadata or {}
+        self._buffer = ""
+        self._offset = 0
+        self._started = False
+
+    def _split(self) -> list[Document]:
+        docs = self._splitter.create_documents([self._buffer], [self._metadata])
+        for doc in docs:
+            doc.metadata["start_index"] += self._offset
+        return docs
+
+    def feed(self, texts: list[str]) -> list[Document]:
+        if not texts:
+            return []
+        piece = "\n".join(texts)
+        self._buffer = f"{self._buffer}\n{piece}" if self._started else piece
+        self._started = True
+        docs = self._split()
+        if len(docs) < 2:
+            return []
+        cut = docs[-1].metadata["start_index"] - self._offset
+        self._buffer = self._buffer[cut:]
+        self._offset += cut
+        return docs[:-1]
+
+    def flush(self) -> list[Document]:
+        docs = self._split() if self._buffer else []
+        self._buffer = ""
+        return docs
@@ -0,0 +1,114 @@
+"""Per-request diagnostics for the ``/files`` endpoints.
+
+``SERVER_TIMING_ENABLED`` adds a ``Server-Timing`` header with the stage
+durations measured before the response started; streamed query responses also
+end with a ``timing`` event covering the whole request. ``PROFILE_SAMPLE_RATE``
+(or a request carrying ``X-Profile-Token: $PROFILE_TOKEN``) runs cProfile
+around a request and writes the stats to ``PROFILE_DIR`` for flame graphs,
+e.g. with ``flameprof`` or ``snakeviz``.
+
+The middleware is only installed when one of them is enabled, so neither
+costs anything otherwise.
+"""
+
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import secrets
+import threading
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .metrics import REQUEST_TIMINGS
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "False") == "True"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", ".cache/profiles")
+PROFILE_MAX_DUMPS = int(os.environ.get("PROFILE_MAX_DUMPS", "100"))
+
+
+def diagnostics_enabled() -> bool:
+    return SERVER_TIMING_ENABLED or PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_TOKEN)
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={s * 1000:.2f}" for name, s in timings.items())
+
+
+def _write_profile(profile: cProfile.Profile, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    profile.dump_stats(path)
+    dumps = sorted(
+        (entry for entry in os.scandir(os.path.dirname(path)) if entry.is_file()),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in dumps[:-PROFILE_MAX_DUMPS]:
+        os.unlink(entry.path)
+
+
+class DiagnosticsMiddleware:
+    """Collects stage timings and profiles sampled requests under ``prefix``.
+
+    cProfile sees the whole event-loop thread, so concurrent requests show up
+    in a dump too; only one request is profiled at a time.
+    """
+
+    def __init__(
+        self,
+        app,
+        prefix: str = "/files",
+        timing: bool = SERVER_TIMING_ENABLED,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        token: str = PROFILE_TOKEN,
+        directory: str = PROFILE_DIR,
+    ):
+        self.app = app
+        self.prefix = prefix
+        self.timing = timing
+        self.sample_rate = sample_rate
+        self.token = token
+        self.directory = directory
+        self._profiling = threading.Lock()
+
+    def _wants_profile(self, scope) -> bool:
+        if self.token:
+            header = Headers(scope=scope).get("x-profile-token", "")
+            if secrets.compare_digest(header, self.token):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict[str, float] | None = {} if self.timing else None
+        reset = REQUEST_TIMINGS.set(timings)
+
+        async def timed_send(message):
+            if timings and message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(timings))
+            await send(message)
+
+        profile = None
+        if self._wants_profile(scope) and self._profiling.acquire(blocking=False):
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            REQUEST_TIMINGS.reset(reset)
+            if profile is not None:
+                profile.disable()
+                self._profiling.release()
+                name = scope["path"].strip("/").replace("/", "-")
+                path = os.path.join(self.directory, f"{time.time():.6f}-{name}.prof")
+                await asyncio.to_thread(_write_profile, profile, path)
+                logger.info("Wrote request profile to %s", path)
@@ -0,0 +1,354 @@
+"""Text embedders.
+
+``EMBEDDER`` selects where vectors come from:
+
+- ``t2v`` (default): the t2v-transformers service, which Weaviate also calls to
+  vectorize chunks and ``nearText`` queries.
+- ``onnx``: a sentence-transformers ONNX model run in-process on CPU. Chunks
+  are written with their vectors into a ``vectorizer: none`` class and queries
+  are embedded locally and searched with ``nearVector``.
+- ``hashing``: a deterministic feature-hashing embedder for tests.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sys
+import unicodedata
+from collections import OrderedDict
+
+import httpx
+import numpy as np
+from fastapi import Request
+from langchain.schema.embeddings import Embeddings
+
+EMBEDDER = os.environ.get("EMBEDDER", "t2v")
+T2V_INFERENCE_API = os.environ.get("T2V_INFERENCE_API", "http://t2v-transformers:8080")
+EMBEDDER_MODEL = os.environ.get(
+    "EMBEDDER_MODEL", "sentence-transformers/multi-qa-MiniLM-L6-cos-v1"
+)
+EMBEDDER_MAX_TOKENS = int(os.environ.get("EMBEDDER_MAX_TOKENS", "512"))
+EMBEDDER_BATCH_SIZE = int(os.environ.get("EMBEDDER_BATCH_SIZE", "32"))
+EMBEDDER_MAX_WAIT_MS = float(os.environ.get("EMBEDDER_MAX_WAIT_MS", "5"))
+EMBEDDER_THREADS = int(os.environ.get("EMBEDDER_THREADS", "0"))
+HASHING_DIMENSIONS = int(os.environ.get("HASHING_DIMENSIONS", "384"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+
+
+class Embedder(Embeddings):
+    """Embeddings with the Weaviate vectorizer they correspond to.
+
+    ``vectorizer`` names the Weaviate module that computes the same vectors
+    server-side; ``None`` means vectors are computed here and pushed to a
+    ``vectorizer: none`` class.
+    """
+
+    vectorizer: str | None = None
+
+    async def aclose(self):
+        pass
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class TransformersEmbedder(Embedder):
+    """Embeds text with the same t2v-transformers service Weaviate vectorizes with."""
+
+    vectorizer = "text2vec-transformers"
+
+    def __init__(self, url: str = T2V_INFERENCE_API, timeout: float = 10.0):
+        self._url = url
+        self._timeout = timeout
+        self._client = httpx.AsyncClient(base_url=url, timeout=timeout)
+
+    def embed_query(self, text: str) -> list[float]:
+        response = httpx.post(
+            f"{self._url}/vectors", json={"text": text}, timeout=self._timeout
+        )
+        response.raise_for_status()
+        return response.json()["vector"]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        response = await self._client.post("/vectors", json={"text": text})
+        response.raise_for_status()
+        return response.json()["vector"]
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic bag-of-words embedder based on feature hashing.
+
+    Needs no model and gives the same vector for the same text in every
+    process, which makes it suitable for tests and local development.
+    """
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        return _normalize(vector)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text).tolist()
+
+
+class _BatchQueue:
+    """Groups concurrent single-text requests into batches.
+
+    The first text of a batch waits at most ``max_wait`` seconds for others to
+    join, up to ``max_batch`` texts, and the batch is encoded in a thread.
+    """
+
+    def __init__(self, encode, max_batch: int, max_wait: float):
+        self._encode = encode
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    async def submit(self, text: str) -> list[float]:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self) -> list[tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        items = [await self._queue.get()]
+        deadline = loop.time() + self._max_wait
+        while len(items) < self._max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            try:
+                vectors = await asyncio.to_thread(
+                    self._encode, [text for text, _ in items]
+                )
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), vector in zip(items, vectors, strict=True):
+                if not future.done():
+                    future.set_result(vector.tolist())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class OnnxEmbedder(Embedder):
+    """Runs a sentence-transformers ONNX export in-process on CPU.
+
+    ``model`` is either a directory holding ``model.onnx`` (or
+    ``onnx/model.onnx``) and ``tokenizer.json``, or a Hugging Face Hub
+    repository to download them from. Token embeddings are mean-pooled and
+    L2-normalized like the sentence-transformers pipeline. Documents are
+    encoded in batches sorted by length to minimize padding; concurrent
+    queries are batched dynamically.
+    """
+
+    def __init__(
+        self,
+        model: str = EMBEDDER_MODEL,
+        batch_size: int = EMBEDDER_BATCH_SIZE,
+        max_wait: float = EMBEDDER_MAX_WAIT_MS / 1000,
+        max_tokens: int = EMBEDDER_MAX_TOKENS,
+        threads: int = EMBEDDER_THREADS,
+    ):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path, tokenizer_path = self._resolve(model)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self._session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._tokenizer.enable_truncation(max_length=max_tokens)
+        self._tokenizer.enable_padding()
+        self.batch_size = batch_size
+        self._queue = _BatchQueue(self._encode, batch_size, max_wait)
+
+    @staticmethod
+    def _resolve(model: str) -> tuple[str, str]:
+        if os.path.isdir(model):
+            onnx_path = os.path.join(model, "onnx", "model.onnx")
+            if not os.path.exists(onnx_path):
+                onnx_path = os.path.join(model, "model.onnx")
+            return onnx_path, os.path.join(model, "tokenizer.json")
+
+        from huggingface_hub import hf_hub_download
+
+        return (
+            hf_hub_download(model, "onnx/model.onnx"),
+            hf_hub_download(model, "tokenizer.json"),
+        )
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        tokens = self._session.run(
+            None, {k: v for k, v in feeds.items() if k in self._inputs}
+        )[0]
+        weights = mask[..., None].astype(np.float32)
+        pooled = (tokens * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return _normalize(pooled)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: list[list[float]] = [[] for _ in texts]
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start : start + self.batch_size]
+            for i, vector in zip(
+                batch, self._encode([texts[i] for i in batch]), strict=True
+            ):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._encode([text])[0].tolist()
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self._queue.submit(text)
+
+    async def aclose(self):
+        await self._queue.aclose()
+
+
+class CachedEmbedder(Embedder):
+    """Keeps the vectors of recent queries in a bounded LRU cache.
+
+    Queries are keyed by their NFKC-normalized, case-folded text with
+    whitespace collapsed, so trivially different spellings of a question share
+    an entry; the normalized text is what gets embedded, which is lossless for
+    the uncased default models. Documents are passed through uncached.
+    """
+
+    def __init__(
+        self, embedder: Embedder, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE
+    ):
+        self.embedder = embedder
+        self.vectorizer = embedder.vectorizer
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+    @staticmethod
+    def _size(key: str, vector: np.ndarray) -> int:
+        return sys.getsizeof(key) + vector.nbytes
+
+    def _get(self, key: str) -> list[float] | None:
+        vector = self._entries.get(key)
+        if vector is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vector.tolist()
+
+    def _put(self, key: str, vector: list[float]):
+        if key in self._entries:
+            return
+        self._entries[key] = np.asarray(vector, dtype=np.float32)
+        self._bytes += self._size(key, self._entries[key])
+        while len(self._entries) > self.max_entries:
+            evicted, old = self._entries.popitem(last=False)
+            self._bytes -= self._size(evicted, old)
+            self.evictions += 1
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embedder.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self.normalize(text)
+        vector = self._get(key)
+        if vector is None:
+            vector = self.embedder.embed_query(key)
+            self._put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self.normalize(text)
+        vector = self._get(key)
+        if vector is None:
+            vector = await self.embedder.aembed_query(key)
+            self._put(key, vector)
+        return vector
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    async def aclose(self):
+        await self.embedder.aclose()
+
+
+EMBEDDERS: dict[str, type[Embedder]] = {
+    "t2v": TransformersEmbedder,
+    "onnx": OnnxEmbedder,
+    "hashing": HashingEmbedder,
+}
+
+
+def create_embedder(name: str = EMBEDDER) -> Embedder:
+    if name not in EMBEDDERS:
+        raise ValueError(
+            f"Unknown EMBEDDER {name!r}, expected one of {list(EMBEDDERS)}"
+        )
+    return EMBEDDERS[name]()
+
+
+def get_embedder(request: Request) -> Embedder:
+    return request.app.state.embedder
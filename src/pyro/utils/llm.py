@@ -0,0 +1,73 @@
+"""The chat model shared by every query.
+
+One ``AzureChatOpenAI`` is created at startup and the temperature is passed
+with each call. The openai client would otherwise open a new aiohttp session,
+and so a new TLS connection to Azure, for every completion; instead all
+completions go through one pooled keep-alive session.
+"""
+
+import os
+from collections.abc import AsyncIterator
+
+import aiohttp
+import openai
+from fastapi import Request
+from langchain.chat_models import AzureChatOpenAI
+from langchain.schema import BaseMessage
+
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "100"))
+LLM_KEEPALIVE_TIMEOUT = float(os.environ.get("LLM_KEEPALIVE_TIMEOUT", "60"))
+
+
+def create_chat_model():
+    return AzureChatOpenAI(
+        deployment_name=os.environ.get("OPENAI_DEPLOYMENT_NAME"),
+        openai_api_base=os.environ.get("OPENAI_API_BASE"),
+        openai_api_version=os.environ.get("OPENAI_API_VERSION", "2024-02-01"),
+        openai_api_key=os.environ.get("OPENAI_API_KEY"),
+        streaming=True,
+    )
+
+
+class ChatClient:
+    """Streams completions from one chat model over a shared HTTP session."""
+
+    def __init__(self, model=None):
+        self._model = model
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def model(self):
+        # Built on first use so that the API starts without Azure credentials.
+        if self._model is None:
+            self._model = create_chat_model()
+        return self._model
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created on first use, inside the event loop that serves requests.
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=LLM_MAX_CONNECTIONS,
+                    keepalive_timeout=LLM_KEEPALIVE_TIMEOUT,
+                )
+            )
+        return self._session
+
+    async def astream(
+        self, messages: list[BaseMessage], temperature: float
+    ) -> AsyncIterator[str]:
+        # openai reads the session from a context variable, so setting it here
+        # only affects the task streaming this completion.
+        openai.aiosession.set(self._get_session())
+        async for chunk in self.model.astream(messages, temperature=temperature):
+            if chunk.content:
+                yield chunk.content
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+def get_chat_client(request: Request) -> ChatClient:
+    return request.app.state.chat
@@ -0,0 +1,546 @@
+"""Single-node vector store kept in a directory of append-only files.
+
+- ``vectors.bin``: a row-major float32 or float16 matrix of L2-normalized
+  vectors, memory-mapped for search.
+- ``chunks.jsonl``: one JSON line per matrix row with the chunk id, file,
+  ``start_index`` and text, only read for the rows a search returns.
+- ``index.bin``: one fixed-size record per matrix row with the chunk UUID, a
+  digest of its file name, its ``start_index`` and the position of its JSON
+  line, memory-mapped so opening the store does not parse the text.
+- ``deleted.bin``: int64 numbers of deleted rows.
+- ``files.jsonl``: the file manifest; the last line for a file wins.
+
+Rows are only ever appended and a row is committed once its ``index.bin``
+record is complete. Writing a chunk id again supersedes its earlier row and
+deleting a chunk tombstones its row, so several ingestion processes can write
+under a file lock while the API process maps whatever has been committed. Chunk
+ids must be UUIDs, as in Weaviate.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections.abc import Callable, Iterable
+from contextlib import contextmanager
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.vectorstore import VectorStore
+
+LOCAL_STORE_DIR = os.environ.get("LOCAL_STORE_DIR", ".cache/vectors")
+LOCAL_STORE_DTYPE = os.environ.get("LOCAL_STORE_DTYPE", "float32")
+LOCAL_STORE_IVF_LISTS = int(os.environ.get("LOCAL_STORE_IVF_LISTS", "0"))
+LOCAL_STORE_IVF_PROBES = int(os.environ.get("LOCAL_STORE_IVF_PROBES", "8"))
+LOCAL_STORE_IVF_MIN_ROWS = int(os.environ.get("LOCAL_STORE_IVF_MIN_ROWS", "20000"))
+LOCAL_STORE_BATCH_SIZE = int(os.environ.get("LOCAL_STORE_BATCH_SIZE", "256"))
+
+SCORE_BLOCK_ROWS = 65536
+
+_INDEX_DTYPE = np.dtype(
+    [
+        ("id", "V16"),
+        ("file", "V16"),
+        ("start", "<i8"),
+        ("offset", "<i8"),
+        ("length", "<i8"),
+    ]
+)
+
+
+def _id_key(_id: str) -> bytes:
+    return uuid.UUID(_id).bytes
+
+
+def _file_key(filename: str | None) -> bytes:
+    return hashlib.blake2b((filename or "").encode(), digest_size=16).digest()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _IvfIndex:
+    """Inverted-file partitioning of the rows by their nearest k-means centroid.
+
+    A search only scores the rows of the ``probes`` lists whose centroids are
+    closest to the query, trading a little recall for scanning a fraction of
+    the matrix.
+    """
+
+    def __init__(self, lists: int, probes: int, iterations: int = 10):
+        self.lists = lists
+        self.probes = probes
+        self.iterations = iterations
+        self.centroids: np.ndarray | None = None
+        self.labels = np.empty(0, dtype=np.int32)
+        self.trained_rows = 0
+
+    def _assign(self, matrix: np.ndarray, start: int) -> np.ndarray:
+        labels = np.empty(len(matrix) - start, dtype=np.int32)
+        for i in range(start, len(matrix), SCORE_BLOCK_ROWS):
+            block = np.asarray(matrix[i : i + SCORE_BLOCK_ROWS], dtype=np.float32)
+            labels[i - start : i - start + len(block)] = np.argmax(
+                block @ self.centroids.T, axis=1
+            )
+        return labels
+
+    def train(self, matrix: np.ndarray, live: np.ndarray):
+        rng = np.random.default_rng(0)
+        rows = np.flatnonzero(live)
+        if not len(rows):
+            return
+        sample = rng.choice(rows, size=min(len(rows), 256 * self.lists), replace=False)
+        points = np.asarray(matrix[np.sort(sample)], dtype=np.float32)
+        # Fewer live rows than lists leaves one partition per row.
+        lists = min(self.lists, len(points))
+        centroids = points[rng.choice(len(points), size=lists, replace=False)]
+        for _ in range(self.iterations):
+            labels = np.argmax(points @ centroids.T, axis=1)
+            for j in range(lists):
+                members = points[labels == j]
+                if len(members):
+                    centroids[j] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids
+        self.labels = self._assign(matrix, 0)
+        self.trained_rows = len(matrix)
+
+    def extend(self, matrix: np.ndarray):
+        if self.centroids is not None and len(matrix) > len(self.labels):
+            self.labels = np.concatenate(
+                [self.labels, self._assign(matrix, len(self.labels))]
+            )
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        probes = np.argsort(self.centroids @ query)[-self.probes :]
+        return np.flatnonzero(np.isin(self.labels, probes))
+
+
+class LocalStore(VectorStore):
+    """Vector store backed by memory-mapped files in ``directory``.
+
+    Search is exact and vectorized over the mapped matrix, or restricted to the
+    closest IVF partitions once more than ``ivf_min_rows`` rows are stored and
+    ``ivf_lists`` is set.
+    """
+
+    def __init__(
+        self,
+        directory: str = LOCAL_STORE_DIR,
+        embedding: Embeddings | None = None,
+        dtype: str = LOCAL_STORE_DTYPE,
+        ivf_lists: int = LOCAL_STORE_IVF_LISTS,
+        ivf_probes: int = LOCAL_STORE_IVF_PROBES,
+        ivf_min_rows: int = LOCAL_STORE_IVF_MIN_ROWS,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._embedding = embedding
+        self._dtype = np.dtype(dtype)
+        self._ivf = _IvfIndex(ivf_lists, ivf_probes) if ivf_lists else None
+        self._ivf_min_rows = ivf_min_rows
+        self._lock = threading.RLock()
+        self._dim: int | None = None
+        self._matrix: np.ndarray | None = None
+        self._index = np.empty(0, dtype=_INDEX_DTYPE)
+        self._row_of: dict[bytes, int] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._deleted_pos = 0
+        self.refresh()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @property
+    def embeddings(self) -> Embeddings | None:
+        return self._embedding
+
+    @contextmanager
+    def _writing(self):
+        """Serialize writers across processes and start from a consistent tail."""
+        with self._lock, open(self._path(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                # Drop whatever an interrupted writer left past the last row.
+                rows = len(self._index)
+                with open(self._path("index.bin"), "ab") as f:
+                    f.truncate(rows * _INDEX_DTYPE.itemsize)
+                with open(self._path("chunks.jsonl"), "ab") as f:
+                    f.truncate(self._sidecar_end())
+                if self._dim is not None:
+                    row_bytes = self._dim * self._dtype.itemsize
+                    with open(self._path("vectors.bin"), "ab") as f:
+                        f.truncate(rows * row_bytes)
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        if self._dim is None and os.path.exists(self._path("meta.json")):
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+            self._dim = meta["dim"]
+            self._dtype = np.dtype(meta["dtype"])
+
+    def _sidecar_end(self) -> int:
+        if not len(self._index):
+            return 0
+        return int(self._index["offset"][-1] + self._index["length"][-1])
+
+    def _read_index(self) -> tuple[int, list[int]]:
+        """Map new rows; returns their number and the rows they supersede."""
+        path = self._path("index.bin")
+        if not os.path.exists(path):
+            return 0, []
+        rows = os.path.getsize(path) // _INDEX_DTYPE.itemsize
+        start = len(self._index)
+        if rows <= start:
+            return 0, []
+        self._index = np.memmap(path, dtype=_INDEX_DTYPE, mode="r", shape=(rows,))
+        superseded = []
+        for row, key in enumerate(self._index["id"][start:].tolist(), start):
+            previous = self._row_of.get(key)
+            if previous is not None:
+                superseded.append(previous)
+            self._row_of[key] = row
+        return rows - start, superseded
+
+    def _read_deleted(self) -> np.ndarray:
+        if not os.path.exists(self._path("deleted.bin")):
+            return np.empty(0, dtype=np.int64)
+        with open(self._path("deleted.bin"), "rb") as f:
+            f.seek(self._deleted_pos)
+            data = f.read()
+        data = data[: len(data) // 8 * 8]
+        self._deleted_pos += len(data)
+        return np.frombuffer(data, dtype=np.int64)
+
+    def refresh(self):
+        """Pick up rows, deletions and files committed by other processes."""
+        with self._lock:
+            self._read_meta()
+            added, superseded = self._read_index()
+            deleted = self._read_deleted()
+            if added:
+                self._live = np.concatenate([self._live, np.ones(added, dtype=bool)])
+                self._matrix = np.memmap(
+                    self._path("vectors.bin"),
+                    dtype=self._dtype,
+                    mode="r",
+                    shape=(len(self._index), self._dim),
+                )
+            self._live[superseded] = False
+            self._live[deleted] = False
+            if self._ivf is not None and added:
+                self._update_ivf()
+
+    def _update_ivf(self):
+        live = int(self._live.sum())
+        if live >= self._ivf_min_rows and live > 2 * self._ivf.trained_rows:
+            self._ivf.train(self._matrix, self._live)
+        else:
+            self._ivf.extend(self._matrix)
+
+    def append(self, records: list[tuple[str, str, int, str, list[float]]]):
+        """Append ``(id, file, start_index, text, vector)`` records."""
+        if not records:
+            return
+        vectors = _normalize(np.asarray([r[4] for r in records], dtype=np.float32))
+        with self._writing():
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                with open(self._path("meta.json"), "w") as f:
+                    json.dump({"dim": self._dim, "dtype": self._dtype.name}, f)
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(
+                    f"Expected vectors of dimension {self._dim}, got {vectors.shape[1]}"
+                )
+            index = np.empty(len(records), dtype=_INDEX_DTYPE)
+            with open(self._path("vectors.bin"), "ab") as f:
+                f.write(vectors.astype(self._dtype).tobytes())
+            with open(self._path("chunks.jsonl"), "ab") as f:
+                offset = f.tell()
+                for i, (_id, file, start_index, text, _) in enumerate(records):
+                    record = {
+                        "id": _id,
+                        "file": file,
+                        "start_index": start_index,
+                        "content": text,
+                    }
+                    line = (json.dumps(record) + "\n").encode()
+                    f.write(line)
+                    start = -1 if start_index is None else start_index
+                    index[i] = (
+                        _id_key(_id),
+                        _file_key(file),
+                        start,
+                        offset,
+                        len(line),
+                    )
+                    offset += len(line)
+            # Written last: the rows only exist once their records do.
+            with open(self._path("index.bin"), "ab") as f:
+                f.write(index.tobytes())
+            self.refresh()
+
+    def delete(self, ids: list[str] | None = None, **kwargs) -> bool:
+        if not ids:
+            return False
+        with self._writing():
+            rows = [
+                row
+                for row in map(self._row_of.get, map(_id_key, ids))
+                if row is not None and self._live[row]
+            ]
+            with open(self._path("deleted.bin"), "ab") as f:
+                f.write(np.asarray(rows, dtype=np.int64).tobytes())
+            self.refresh()
+        return True
+
+    def count(self) -> int:
+        """Number of live chunks."""
+        self.refresh()
+        return int(self._live.sum())
+
+    def chunks(self, filename: str) -> dict[str, int]:
+        """Map the id of every live chunk of ``filename`` to its start index."""
+        self.refresh()
+        rows = np.flatnonzero(
+            self._live & (self._index["file"] == np.void(_file_key(filename)))
+        )
+        records = self._index[rows]
+        return {
+            str(uuid.UUID(bytes=key)): start if start >= 0 else None
+            for key, start in zip(
+                records["id"].tolist(), records["start"].tolist(), strict=True
+            )
+        }
+
+    def vectors(self, ids: list[str]) -> dict[str, list[float]]:
+        self.refresh()
+        rows = {_id: self._row_of.get(_id_key(_id)) for _id in ids}
+        return {
+            _id: np.asarray(self._matrix[row], np.float32).tolist()
+            for _id, row in rows.items()
+            if row is not None and self._live[row]
+        }
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+        if rows is not None:
+            return np.asarray(self._matrix[rows], dtype=np.float32) @ query
+        scores = np.empty(len(self._matrix), dtype=np.float32)
+        for i in range(0, len(self._matrix), SCORE_BLOCK_ROWS):
+            block = np.asarray(self._matrix[i : i + SCORE_BLOCK_ROWS], np.float32)
+            scores[i : i + len(block)] = block @ query
+        return scores
+
+    def _top_k(self, query: np.ndarray, k: int) -> list[tuple[int, float]]:
+        if self._matrix is None or k <= 0:
+            return []
+        rows = None
+        if self._ivf is not None and self._ivf.centroids is not None:
+            rows = self._ivf.candidates(query)
+            rows = rows[self._live[rows]]
+            scores = self._scores(query, rows)
+        else:
+            scores = self._scores(query, None)
+            scores[~self._live] = -np.inf
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return [
+            (int(rows[i] if rows is not None else i), float(scores[i])) for i in top
+        ]
+
+    def _document(self, f, row: int, score: float, additional) -> Document:
+        f.seek(int(self._index["offset"][row]))
+        record = json.loads(f.read(int(self._index["length"][row])))
+        metadata = {"file": record["file"], "start_index": record["start_index"]}
+        if additional:
+            extra = {"id": record["id"], "distance": 1 - score}
+            if "vector" in additional:
+                extra["vector"] = np.asarray(self._matrix[row], np.float32).tolist()
+            metadata["_additional"] = {
+                k: v for k, v in extra.items() if k in additional
+            }
+        return Document(page_content=record["content"], metadata=metadata)
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs
+    ) -> list[Document]:
+        self.refresh()
+        with self._lock:
+            query = _normalize(np.asarray(embedding, dtype=np.float32))
+            top = self._top_k(query, k)
+            if not top or not os.path.exists(self._path("chunks.jsonl")):
+                return []
+            with open(self._path("chunks.jsonl"), "rb") as f:
+                return [
+                    self._document(f, row, score, kwargs.get("additional"))
+                    for row, score in top
+                ]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list[Document]:
+        if self._embedding is None:
+            raise ValueError("LocalStore needs an embedding to search by text")
+        embedding = self._embedding.embed_query(query)
+        return self.similarity_search_by_vector(embedding, k, **kwargs)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+        **kwargs,
+    ) -> list[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self.append(
+            [
+                (_id, meta.get("file"), meta.get("start_index"), text, vector)
+                for _id, meta, text, vector in zip(
+                    ids, metadatas, texts, vectors, strict=True
+                )
+            ]
+        )
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        **kwargs,
+    ) -> "LocalStore":
+        store = cls(embedding=embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def is_current(self, filename: str, file_hash: str, chunk_size: int) -> bool:
+        entry = self._file_entries().get(filename)
+        return (
+            entry is not None
+            and entry["file_hash"] == file_hash
+            and entry["chunk_size"] == chunk_size
+        )
+
+    def _file_entries(self) -> dict[str, dict]:
+        entries = {}
+        if os.path.exists(self._path("files.jsonl")):
+            with open(self._path("files.jsonl")) as f:
+                for line in f:
+                    if line.endswith("\n"):
+                        entry = json.loads(line)
+                        entries[entry["file"]] = entry
+        return entries
+
+    def generation(self) -> str:
+        """A token that changes whenever rows are written or deleted."""
+        sizes = []
+        for name in ("index.bin", "deleted.bin"):
+            path = self._path(name)
+            sizes.append(os.path.getsize(path) if os.path.exists(path) else 0)
+        return ":".join(map(str, sizes))
+
+    def mark(self, filename: str, file_hash: str, chunk_size: int, chunks: int):
+        entry = {
+            "file": filename,
+            "file_hash": file_hash,
+            "chunk_size": chunk_size,
+            "chunks": chunks,
+        }
+        with self._writing(), open(self._path("files.jsonl"), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class LocalFileManifest:
+    """The :class:`~pyro.utils.manifest.FileManifest` interface over a LocalStore."""
+
+    def __init__(self, store: LocalStore):
+        self._store = store
+
+    def is_current(self, filename: str, file_hash: str, chunk_size: int) -> bool:
+        return self._store.is_current(filename, file_hash, chunk_size)
+
+    def mark(self, filename: str, file_hash: str, chunk_size: int, chunks: int):
+        self._store.mark(filename, file_hash, chunk_size, chunks)
+
+    def existing_chunks(self, filename: str) -> dict[str, int]:
+        return self._store.chunks(filename)
+
+    def vectors(self, ids: list[str]) -> dict[str, list[float]]:
+        return self._store.vectors(ids)
+
+    def delete(self, ids: list[str]):
+        self._store.delete(ids)
+
+    def generation(self) -> str:
+        return self._store.generation()
+
+    def bump_generation(self):
+        # The generation is derived from the append-only files themselves.
+        pass
+
+
+class LocalBatchWriter:
+    """The :class:`~pyro.utils.writer.BatchWriter` interface over a LocalStore.
+
+    Objects are appended in batches of ``batch_size``; every object needs a
+    vector since the store has no vectorizer.
+    """
+
+    def __init__(
+        self,
+        store: LocalStore,
+        batch_size: int = LOCAL_STORE_BATCH_SIZE,
+        on_progress: Callable[[int, int], None] | None = None,
+    ):
+        self._store = store
+        self._batch_size = batch_size
+        self._on_progress = on_progress
+        self.written = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def _flush(self, batch: list[tuple[str, str, int, str, list[float]]]):
+        self._store.append(batch)
+        self.written += len(batch)
+        if self._on_progress is not None:
+            self._on_progress(self.written, self.failed)
+
+    def write(
+        self, objects: Iterable[tuple[Document, str | None, list[float] | None]]
+    ) -> list[str]:
+        ids = []
+        batch = []
+        for doc, _id, vector in objects:
+            if vector is None:
+                raise ValueError("LocalStore objects must come with a vector")
+            _id = _id or str(uuid.uuid4())
+            ids.append(_id)
+            batch.append(
+                (
+                    _id,
+                    doc.metadata.get("file"),
+                    doc.metadata.get("start_index"),
+                    doc.page_content,
+                    vector,
+                )
+            )
+            if len(batch) >= self._batch_size:
+                self._flush(batch)
+                batch = []
+        self._flush(batch)
+        return ids
@@ -0,0 +1,160 @@
+import hashlib
+import uuid
+from collections import Counter
+
+import weaviate
+from langchain.schema import Document
+from weaviate.util import generate_uuid5
+
+from .store import WEAVIATE_COLLECTION
+
+PAGE_SIZE = 1000
+ID_BATCH = 100
+# Manifest entry whose hash changes whenever ingestion changes the collection.
+GENERATION_ID = generate_uuid5("generation", "pyro")
+
+
+class ChunkIds:
+    """Derives deterministic Weaviate UUIDs for the chunks of one file.
+
+    The id depends on the chunk text, not its offset, so chunks that survive an
+    edit keep their id. Repeated chunks are told apart by their occurrence, so
+    chunks must be passed in document order.
+    """
+
+    def __init__(self, filename: str):
+        self._filename = filename
+        self._seen = Counter()
+
+    def __call__(self, doc: Document) -> str:
+        digest = hashlib.sha256(doc.page_content.encode()).hexdigest()
+        self._seen[digest] += 1
+        return generate_uuid5(f"{digest}:{self._seen[digest]}", self._filename)
+
+
+def _ids_filter(ids: list[str]) -> dict:
+    return {
+        "operator": "Or",
+        "operands": [
+            {"path": ["id"], "operator": "Equal", "valueText": _id} for _id in ids
+        ],
+    }
+
+
+class FileManifest:
+    """Tracks which file versions and chunk ids are already in the collection."""
+
+    def __init__(self, client: weaviate.Client, class_name: str = WEAVIATE_COLLECTION):
+        self._client = client
+        self._class_name = class_name
+        self._files_class_name = f"{class_name}Files"
+
+    def is_current(self, filename: str, file_hash: str, chunk_size: int) -> bool:
+        entry = self._client.data_object.get_by_id(
+            generate_uuid5(filename), class_name=self._files_class_name
+        )
+        if entry is None:
+            return False
+        properties = entry["properties"]
+        return (
+            properties.get("file_hash") == file_hash
+            and properties.get("chunk_size") == chunk_size
+        )
+
+    def _put(self, object_id: str, properties: dict):
+        data_object = self._client.data_object
+        if data_object.exists(object_id, class_name=self._files_class_name):
+            data_object.replace(
+                properties, class_name=self._files_class_name, uuid=object_id
+            )
+        else:
+            data_object.create(
+                properties, class_name=self._files_class_name, uuid=object_id
+            )
+
+    def mark(self, filename: str, file_hash: str, chunk_size: int, chunks: int):
+        properties = {
+            "file": filename,
+            "file_hash": file_hash,
+            "chunks": chunks,
+            "chunk_size": chunk_size,
+        }
+        self._put(generate_uuid5(filename), properties)
+
+    def generation(self) -> str | None:
+        """A token that changes whenever ingestion changes the collection."""
+        entry = self._client.data_object.get_by_id(
+            GENERATION_ID, class_name=self._files_class_name
+        )
+        return entry["properties"].get("file_hash") if entry is not None else None
+
+    def bump_generation(self):
+        properties = {
+            "file": "",
+            "file_hash": uuid.uuid4().hex,
+            "chunks": 0,
+            "chunk_size": 0,
+        }
+        self._put(GENERATION_ID, properties)
+
+    def existing_chunks(self, filename: str) -> dict[str, int]:
+        """Map the id of every stored chunk of ``filename`` to its start index."""
+        chunks = {}
+        last = -1
+        while True:
+            result = (
+                self._client.query.get(self._class_name, ["file", "start_index"])
+                .with_additional(["id"])
+                .with_where(
+                    {
+                        "operator": "And",
+                        "operands": [
+                            {
+                                "path": ["file"],
+                                "operator": "Equal",
+                                "valueText": filename,
+                            },
+                            {
+                                "path": ["start_index"],
+                                "operator": "GreaterThan",
+                                "valueInt": last,
+                            },
+                        ],
+                    }
+                )
+                .with_sort({"path": ["start_index"], "order": "asc"})
+                .with_limit(PAGE_SIZE)
+                .do()
+            )
+            if "errors" in result:
+                raise ValueError(f"Error during query: {result['errors']}")
+            objects = result["data"]["Get"][self._class_name]
+            for obj in objects:
+                if obj["file"] == filename:
+                    chunks[obj["_additional"]["id"]] = obj["start_index"]
+            if len(objects) < PAGE_SIZE:
+                return chunks
+            last = objects[-1]["start_index"]
+
+    def vectors(self, ids: list[str]) -> dict[str, list[float]]:
+        vectors = {}
+        for i in range(0, len(ids), ID_BATCH):
+            batch = ids[i : i + ID_BATCH]
+            result = (
+                self._client.query.get(self._class_name)
+                .with_additional(["id", "vector"])
+                .with_where(_ids_filter(batch))
+                .with_limit(len(batch))
+                .do()
+            )
+            if "errors" in result:
+                raise ValueError(f"Error during query: {result['errors']}")
+            for obj in result["data"]["Get"][self._class_name]:
+                vectors[obj["_additional"]["id"]] = obj["_additional"]["vector"]
+        return vectors
+
+    def delete(self, ids: list[str]):
+        for i in range(0, len(ids), ID_BATCH):
+            self._client.batch.delete_objects(
+                self._class_name, where=_ids_filter(ids[i : i + ID_BATCH])
+            )
@@ -0,0 +1,304 @@
+"""Process-local metrics rendered in the Prometheus text format.
+
+A small stand-in for ``prometheus_client``: counters, gauges and histograms
+with labels, plus callback metrics that are sampled when scraped. Recording is
+a dict lookup and an addition, so timers can sit on the hot path.
+"""
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)  # fmt: skip
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: Registry = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+
+class _Labeled(_Metric, ABC):
+    """A metric recorded through one child per combination of label values."""
+
+    def __init__(self, *args, **kwargs):
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    @abstractmethod
+    def _child(self):
+        """A new child holding the values of one label combination."""
+
+    def labels(self, *values, **labels):
+        key = values or tuple(labels[name] for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._child())
+        return child
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    @contextmanager
+    def track_inprogress(self):
+        self.value += 1
+        try:
+            yield
+        finally:
+            self.value -= 1
+
+
+class Counter(_Labeled):
+    kind = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def collect(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            labels = _labels(self.labelnames, key)
+            yield f"{self.name}_total{labels} {_number(child.value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def collect(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(child.value)}"
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Labeled):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(*args, **kwargs)
+
+    def _child(self):
+        return _Histogram(self.buckets)
+
+    def collect(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(
+                (*self.buckets, float("inf")), child.counts, strict=True
+            ):
+                cumulative += count
+                labels = _labels(self.labelnames, key, f'le="{_number(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_number(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Sampled(_Metric):
+    """A metric whose samples are produced by ``fn`` at scrape time.
+
+    ``fn`` returns ``(label values, value)`` pairs, e.g. read from the stats of
+    a cache, so nothing is recorded on the hot path at all.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Iterable[str],
+        fn: Callable[[], Iterable[tuple[tuple, float]]],
+        registry: Registry = REGISTRY,
+    ):
+        self.kind = kind
+        self._fn = fn
+        super().__init__(name, documentation, labelnames, registry)
+
+    def collect(self) -> Iterator[str]:
+        suffix = "_total" if self.kind == "counter" else ""
+        for key, value in self._fn():
+            labels = _labels(self.labelnames, key)
+            yield f"{self.name}{suffix}{labels} {_number(value)}"
+
+
+STAGE_SECONDS = Histogram(
+    "pyro_stage_duration_seconds",
+    "Time spent in each stage of the query and ingestion pipelines.",
+    ["pipeline", "stage"],
+)
+IN_FLIGHT = Gauge(
+    "pyro_requests_in_flight",
+    "Requests currently being handled, including streaming responses.",
+    ["endpoint"],
+)
+TOKENS = Counter(
+    "pyro_tokens",
+    "Prompt tokens (estimated) sent to and completion chunks streamed from the LLM.",
+    ["kind"],
+)
+CHUNKS = Counter(
+    "pyro_ingest_chunks",
+    "Chunks processed by ingestion jobs by outcome.",
+    ["result"],
+)
+JOBS = Counter("pyro_ingest_jobs", "Finished ingestion jobs by status.", ["status"])
+ERRORS = Counter(
+    "pyro_errors",
+    "Failures by pipeline and stage.",
+    ["pipeline", "stage"],
+)
+COALESCED = Counter(
+    "pyro_coalesced_queries",
+    "Queries that joined an identical query already in flight.",
+)
+ADMISSIONS = Counter(
+    "pyro_admission_decisions",
+    "Queries admitted at once or after queueing, and queries refused by reason.",
+    ["result"],
+)
+HTTP_REQUESTS = Counter(
+    "pyro_http_requests",
+    "HTTP requests by endpoint and status code.",
+    ["endpoint", "status"],
+)
+
+
+# Per-request stage durations, collected only while a request opted in.
+REQUEST_TIMINGS: ContextVar[dict[str, float] | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def observe_stage(pipeline: str, name: str, seconds: float):
+    STAGE_SECONDS.labels(pipeline, name).observe(seconds)
+    timings = REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(pipeline: str, name: str):
+    """Time a pipeline stage and count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(pipeline, name).inc()
+        raise
+    finally:
+        observe_stage(pipeline, name, time.perf_counter() - start)
+
+
+async def track_stream(tokens: AsyncIterator[str], endpoint: str):
+    """Count ``endpoint`` as in flight while ``tokens`` is being streamed."""
+    with IN_FLIGHT.labels(endpoint).track_inprogress():
+        async for token in tokens:
+            yield token
+
+
+class MetricsMiddleware:
+    """Counts HTTP responses by endpoint function name and status code."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def recording_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            endpoint = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            HTTP_REQUESTS.labels(endpoint, status).inc()
@@ -0,0 +1,73 @@
+"""On-disk cache of parsed PDF text.
+
+Parsing is by far the most expensive ingestion step, while chunking is cheap.
+Page texts are stored gzip-compressed per file content hash and parser version,
+so re-chunking a file, for example with another ``chunk_size``, skips parsing.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections.abc import Iterator
+
+from .pdf import PARSER_VERSION, iter_pages
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_ENABLED = os.environ.get("PARSE_CACHE_ENABLED", "True") == "True"
+PARSE_CACHE_DIR = os.environ.get("PARSE_CACHE_DIR", ".cache/parsed")
+
+
+class ParseCache:
+    """Caches the page batches of :func:`iter_pages` in ``directory``.
+
+    Entries are only published once a file was parsed completely, so an
+    interrupted parse never leaves a truncated entry behind.
+    """
+
+    def __init__(self, directory: str = PARSE_CACHE_DIR, version=PARSER_VERSION):
+        self.directory = directory
+        self.version = hashlib.sha256(version.encode()).hexdigest()[:12]
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, file_hash: str) -> str:
+        return os.path.join(self.directory, f"{file_hash}.{self.version}.jsonl.gz")
+
+    def load(self, file_hash: str) -> list[tuple[int, list[str]]] | None:
+        path = self._path(file_hash)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return [tuple(json.loads(line)) for line in f]
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError):
+            logger.warning("Discarding unreadable parse cache entry %s", path)
+            os.unlink(path)
+            return None
+
+    def _store(self, file_hash: str, batches) -> Iterator[tuple[int, list[str]]]:
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with (
+                os.fdopen(fd, "wb") as raw,
+                gzip.open(raw, "wt", encoding="utf-8") as f,
+            ):
+                for batch in batches:
+                    f.write(json.dumps(batch) + "\n")
+                    yield batch
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        os.replace(tmp, self._path(file_hash))
+
+    def pages(
+        self, path: str, file_hash: str, batch_pages: int
+    ) -> tuple[bool, Iterator[tuple[int, list[str]]]]:
+        """Return whether ``file_hash`` was cached and its page batches."""
+        cached = self.load(file_hash)
+        if cached is not None:
+            return True, iter(cached)
+        return False, self._store(file_hash, iter_pages(path, batch_pages))
@@ -0,0 +1,87 @@
+"""Page-incremental PDF text extraction.
+
+Text-extractable PDFs are read page by page with pdfminer, mirroring the
+``fast`` strategy of ``unstructured.partition.pdf`` so element texts match what
+``partition_pdf`` would return. PDFs without any extractable text fall back to
+a full ``partition_pdf`` run, which handles OCR and layout models.
+
+pdfminer and unstructured are imported on first use: they take most of the
+import time and memory of the ingestion stack, and query-only processes never
+parse PDFs.
+"""
+
+import hashlib
+import re
+from collections.abc import Iterator
+from importlib.metadata import version
+
+# Bump the trailing revision whenever the extraction below changes its output.
+PARSER_VERSION = (
+    f"pdfminer-{version('pdfminer.six')}+unstructured-{version('unstructured')}+2"
+)
+
+
+def count_pages(path: str) -> int:
+    from pdfminer.pdfpage import PDFPage
+
+    with open(path, "rb") as fp:
+        return sum(1 for _ in PDFPage.get_pages(fp))
+
+
+def _extract_text(item) -> str:
+    from pdfminer.layout import LTContainer
+
+    if hasattr(item, "get_text"):
+        return item.get_text()
+    if isinstance(item, LTContainer):
+        return "".join(_extract_text(child) or "" for child in item)
+    return "\n"
+
+
+def _page_texts(page) -> list[str]:
+    from unstructured.cleaners.core import clean_bullets, clean_extra_whitespace
+    from unstructured.nlp.patterns import PARAGRAPH_PATTERN
+    from unstructured.partition.text_type import is_bulleted_text
+
+    segments = []
+    for obj in page:
+        if hasattr(obj, "get_text"):
+            snippets = [obj.get_text()]
+        else:
+            snippets = re.split(PARAGRAPH_PATTERN, _extract_text(obj))
+        x0, _, _, top = obj.bbox
+        for snippet in snippets:
+            snippet = clean_extra_whitespace(snippet)
+            if not snippet.strip():
+                continue
+            # element_from_text only rewrites the text of list items; ties are
+            # broken by the element id, a hash of that text.
+            if is_bulleted_text(snippet):
+                snippet = clean_bullets(snippet)
+            element_id = hashlib.sha256(snippet.encode()).hexdigest()[:32]
+            segments.append((page.height - top, x0, element_id, snippet))
+    return [text for *_, text in sorted(segments)]
+
+
+def iter_pages(path: str, batch_pages: int) -> Iterator[tuple[int, list[str]]]:
+    """Yield ``(last page number, element texts)`` every ``batch_pages`` pages."""
+    from pdfminer.high_level import extract_pages
+
+    found_text = False
+    texts: list[str] = []
+    number = 0
+    with open(path, "rb") as fp:
+        for number, page in enumerate(extract_pages(fp), start=1):
+            page_texts = _page_texts(page)
+            found_text = found_text or bool(page_texts)
+            texts.extend(page_texts)
+            if number % batch_pages == 0:
+                yield number, texts
+                texts = []
+    if texts:
+        yield number, texts
+    if not found_text:
+        from unstructured.partition.pdf import partition_pdf
+
+        elements = partition_pdf(filename=path)
+        yield number, [ele.text for ele in elements]
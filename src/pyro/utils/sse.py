@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import os
+from collections.abc import AsyncIterator
+
+from .metrics import ERRORS
+
+logger = logging.getLogger(__name__)
+
+SSE_FLUSH_INTERVAL = float(os.environ.get("SSE_FLUSH_INTERVAL_MS", "40")) / 1000
+SSE_MAX_EVENT_CHARS = int(os.environ.get("SSE_MAX_EVENT_CHARS", "512"))
+
+
+def format_event(data: str, event: str | None = None) -> str:
+    """Frame ``data`` as a single Server-Sent Event."""
+    lines = [f"event: {event}"] if event else []
+    normalized = data.replace("\r\n", "\n").replace("\r", "\n")
+    lines.extend(f"data: {line}" for line in normalized.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def coalesce(
+    tokens: AsyncIterator[str],
+    interval: float = SSE_FLUSH_INTERVAL,
+    max_chars: int = SSE_MAX_EVENT_CHARS,
+) -> AsyncIterator[str]:
+    """Group tokens into chunks flushed every ``interval`` seconds.
+
+    The first token is emitted as soon as it arrives so time-to-first-token is
+    not penalised by the grouping window.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = aiter(tokens)
+    buffer: list[str] = []
+    size = 0
+    deadline = None
+    window = 0.0
+    pending = asyncio.ensure_future(anext(iterator))
+    try:
+        while True:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                if size:
+                    yield "".join(buffer)
+                    window = interval
+                buffer, size, deadline = [], 0, None
+                continue
+            task, pending = pending, None
+            if (error := task.exception()) is not None:
+                break
+            pending = asyncio.ensure_future(anext(iterator))
+            token = task.result()
+            buffer.append(token)
+            size += len(token)
+            if deadline is None:
+                deadline = loop.time() + window
+            if size >= max_chars:
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+        # Tokens generated before a failure are sent before it is reported.
+        if size:
+            yield "".join(buffer)
+        if not isinstance(error, StopAsyncIteration):
+            raise error
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def event_stream(
+    tokens: AsyncIterator[str], timings: dict[str, float] | None = None
+) -> AsyncIterator[str]:
+    """Encode a token stream as SSE ``message`` events followed by ``end``.
+
+    With ``timings``, a ``timing`` event carrying the stage durations in
+    milliseconds is sent right before ``end``.
+    """
+    try:
+        async for chunk in coalesce(tokens):
+            yield format_event(chunk)
+    except Exception as e:
+        logger.exception("Streaming response failed")
+        ERRORS.labels("query", "stream").inc()
+        yield format_event(str(e), event="error")
+        return
+    if timings is not None:
+        durations = {name: round(s * 1000, 2) for name, s in timings.items()}
+        yield format_event(json.dumps(durations), event="timing")
+    yield format_event("", event="end")
@@ -1,42 +1,132 @@
+import logging
 import os
 
 import weaviate
+from fastapi import Request
+from langchain.schema.vectorstore import VectorStore
 from langchain.vectorstores import Weaviate
+from weaviate.config import Config, ConnectionConfig
+
+from .embeddings import Embedder
+
+logger = logging.getLogger(__name__)
+
+STORE_BACKEND = os.environ.get("STORE_BACKEND", "weaviate")
+WEAVIATE_COLLECTION = os.environ.get("WEAVIATE_COLLECTION", "Document")
+WEAVIATE_FILES_COLLECTION = f"{WEAVIATE_COLLECTION}Files"
+WEAVIATE_POOL_SIZE = int(os.environ.get("WEAVIATE_POOL_SIZE", "32"))
+
+PROPERTIES = [
+    {"name": "title", "dataType": ["text"]},
+    {"name": "content", "dataType": ["text"]},
+    {"name": "file", "dataType": ["text"], "tokenization": "field"},
+    {"name": "start_index", "dataType": ["int"]},
+]
+
+FILES_SCHEMA = {
+    "vectorizer": "none",
+    "properties": [
+        {"name": "file", "dataType": ["text"], "tokenization": "field"},
+        {"name": "file_hash", "dataType": ["text"], "tokenization": "field"},
+        {"name": "chunks", "dataType": ["int"]},
+        {"name": "chunk_size", "dataType": ["int"]},
+    ],
+}
+
+
+def create_client(pool_size: int = WEAVIATE_POOL_SIZE) -> weaviate.Client:
+    return weaviate.Client(
+        f'http://{os.environ["WEAVIATE_SERVICE_NAME"]}:{os.environ["WEAVIATE_PORT"]}',
+        additional_config=Config(
+            connection_config=ConnectionConfig(
+                session_pool_connections=pool_size,
+                session_pool_maxsize=pool_size,
+            )
+        ),
+    )
 
 
 def create_class(
-    client: weaviate.Client, drop: bool = False, class_name: str = "Document"
+    client: weaviate.Client,
+    drop: bool = False,
+    class_name: str = "Document",
+    vectorizer: str | None = "text2vec-transformers",
 ):
+    """Create or migrate the chunk and file manifest classes.
+
+    ``vectorizer`` is the module Weaviate vectorizes chunks with, or ``None``
+    when vectors are computed by pyro and written with the objects.
+    """
+    files_class_name = f"{class_name}Files"
     if drop:
         client.schema.delete_class(class_name)
+        client.schema.delete_class(files_class_name)
     schema = {
         "class": class_name,
-        "vectorizer": "text2vec-transformers",
-        "moduleConfig": {"text2vec-transformers": {"vectorizeClassName": "false"}},
-        "properties": [
-            {"name": "title", "dataType": ["text"]},
-            {"name": "content", "dataType": ["text"]},
-        ],
+        "vectorizer": vectorizer or "none",
+        "properties": PROPERTIES,
     }
+    if vectorizer is not None:
+        schema["moduleConfig"] = {vectorizer: {"vectorizeClassName": "false"}}
+    if not client.schema.exists(files_class_name):
+        client.schema.create_class({"class": files_class_name, **FILES_SCHEMA})
     if not client.schema.exists(class_name):
         client.schema.create_class(schema)
+        return
 
+    current = client.schema.get(class_name)
+    if current.get("vectorizer") != schema["vectorizer"]:
+        logger.warning(
+            "Class %s is vectorized with %s instead of %s, recreate the class "
+            "with WEAVIATE_DROP_COLLECTION=True to switch embedders",
+            class_name,
+            current.get("vectorizer"),
+            schema["vectorizer"],
+        )
+    existing = {prop["name"]: prop for prop in current["properties"]}
+    for prop in PROPERTIES:
+        if prop["name"] not in existing:
+            logger.info("Adding property %s to class %s", prop["name"], class_name)
+            client.schema.property.create(class_name, prop)
+        elif existing[prop["name"]].get("dataType") != prop["dataType"]:
+            # E.g. start_index stored as a number by auto-schema, which breaks
+            # the valueInt filters of the file manifest.
+            logger.warning(
+                "Property %s of class %s has type %s instead of %s, recreate the "
+                "class with WEAVIATE_DROP_COLLECTION=True to migrate it",
+                prop["name"],
+                class_name,
+                existing[prop["name"]].get("dataType"),
+                prop["dataType"],
+            )
+        elif existing[prop["name"]].get("tokenization", "word") != prop.get(
+            "tokenization", "word"
+        ):
+            logger.warning(
+                "Property %s of class %s uses %s tokenization, recreate the class "
+                "with WEAVIATE_DROP_COLLECTION=True to migrate it",
+                prop["name"],
+                class_name,
+                existing[prop["name"]].get("tokenization"),
+            )
 
-def get_store():
-    weaviate_client = weaviate.Client(
-        f'http://{os.environ["WEAVIATE_SERVICE_NAME"]}:{os.environ["WEAVIATE_PORT"]}'
-    )
 
-    create_class(
-        weaviate_client,
-        os.environ.get("WEAVIATE_DROP_COLLECTION", "False") == "True",
-        os.environ.get("WEAVIATE_COLLECTION", "Document"),
-    )
+def close_client(client: weaviate.Client):
+    # weaviate-client 3.x has no public close; its connection owns the pooled
+    # requests session that would otherwise stay open until exit.
+    client._connection.close()
+
 
-    vectorstore = Weaviate(
-        client=weaviate_client,
-        index_name=os.environ.get("WEAVIATE_COLLECTION", "Document"),
+def create_store(client: weaviate.Client, embedder: Embedder | None = None):
+    return Weaviate(
+        client=client,
+        index_name=WEAVIATE_COLLECTION,
         text_key="content",
+        embedding=embedder,
+        attributes=["file", "start_index"],
+        by_text=embedder is None or embedder.vectorizer is not None,
     )
 
-    yield vectorstore
+
+def get_store(request: Request) -> VectorStore:
+    return request.app.state.vectorstore
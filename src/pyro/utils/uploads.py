@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+INGEST_SPOOL_DIR = os.environ.get("INGEST_SPOOL_DIR") or tempfile.gettempdir()
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """Rejects request bodies above ``max_bytes`` while they stream in.
+
+    Requests announcing a larger ``Content-Length`` are refused before any of
+    the body is read; chunked bodies are cut off as soon as they cross the
+    limit.
+    """
+
+    def __init__(self, app, path: str = "/files/upload", max_bytes=MAX_UPLOAD_BYTES):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def _check_length(self, scope, too_large: PlainTextResponse):
+        """The response refusing the announced ``Content-Length``, if any."""
+        length = Headers(scope=scope).get("content-length")
+        if length is None:
+            return None
+        if not length.isdigit():
+            return PlainTextResponse("Invalid Content-Length", status_code=400)
+        return too_large if int(length) > self.max_bytes else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        response = PlainTextResponse(
+            f"Upload exceeds the limit of {self.max_bytes} bytes", status_code=413
+        )
+        refusal = self._check_length(scope, response)
+        if refusal is not None:
+            await refusal(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge
+            return message
+
+        async def guarded_send(message):
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded:
+            await response(scope, receive, send)
+
+
+def _spool(source: BinaryIO) -> tuple[str, str]:
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=INGEST_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as target:
+            while chunk := source.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Upload exceeds the limit of {MAX_UPLOAD_BYTES} bytes",
+                    )
+                digest.update(chunk)
+                target.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest()
+
+
+async def spool_upload(file: UploadFile) -> tuple[str, str]:
+    """Copy ``file`` to a temporary path in fixed-size chunks.
+
+    Returns the path and the SHA-256 of the content; the caller owns the file.
+    """
+    return await asyncio.to_thread(_spool, file.file)
@@ -0,0 +1,103 @@
+import os
+import threading
+from collections.abc import Callable, Iterable
+
+import weaviate
+from langchain.schema import Document
+from weaviate.batch.crud_batch import WeaviateErrorRetryConf
+
+from .store import WEAVIATE_COLLECTION
+
+WEAVIATE_BATCH_SIZE = int(os.environ.get("WEAVIATE_BATCH_SIZE", "100"))
+WEAVIATE_BATCH_WORKERS = int(os.environ.get("WEAVIATE_BATCH_WORKERS", "2"))
+WEAVIATE_BATCH_CREATION_TIME = float(
+    os.environ.get("WEAVIATE_BATCH_CREATION_TIME", "10")
+)
+WEAVIATE_BATCH_RETRIES = int(os.environ.get("WEAVIATE_BATCH_RETRIES", "3"))
+WEAVIATE_BATCH_MAX_ERRORS = int(os.environ.get("WEAVIATE_BATCH_MAX_ERRORS", "100"))
+
+
+class BatchWriter:
+    """Writes documents through the Weaviate batch API.
+
+    With ``dynamic`` batching the client resizes batches so each one takes about
+    ``creation_time`` seconds to be vectorized and stored, which backs off
+    automatically when the vectorizer is saturated. Objects rejected by Weaviate
+    are retried ``retries`` times and then reported in :attr:`errors`.
+    """
+
+    def __init__(
+        self,
+        client: weaviate.Client,
+        class_name: str = WEAVIATE_COLLECTION,
+        text_key: str = "content",
+        batch_size: int = WEAVIATE_BATCH_SIZE,
+        num_workers: int = WEAVIATE_BATCH_WORKERS,
+        creation_time: float = WEAVIATE_BATCH_CREATION_TIME,
+        retries: int = WEAVIATE_BATCH_RETRIES,
+        on_progress: Callable[[int, int], None] | None = None,
+    ):
+        self._client = client
+        self._class_name = class_name
+        self._text_key = text_key
+        self._batch_size = batch_size
+        self._num_workers = num_workers
+        self._creation_time = creation_time
+        self._retries = retries
+        self._on_progress = on_progress
+        self._lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def _on_result(self, results: list[dict] | None):
+        with self._lock:
+            for result in results or []:
+                errors = (result.get("result") or {}).get("errors")
+                if not errors:
+                    self.written += 1
+                    continue
+                self.failed += 1
+                if len(self.errors) < WEAVIATE_BATCH_MAX_ERRORS:
+                    properties = result.get("properties", {})
+                    self.errors.append(
+                        {
+                            "id": result.get("id"),
+                            "file": properties.get("file"),
+                            "start_index": properties.get("start_index"),
+                            "errors": [e["message"] for e in errors["error"]],
+                        }
+                    )
+            if self._on_progress is not None:
+                self._on_progress(self.written, self.failed)
+
+    def write(
+        self, objects: Iterable[tuple[Document, str | None, list[float] | None]]
+    ) -> list[str]:
+        """Write ``(document, uuid, vector)`` triples, consuming them lazily.
+
+        A ``None`` uuid lets Weaviate pick one and a ``None`` vector has the
+        class vectorizer embed the document.
+        """
+        ids = []
+        self._client.batch.configure(
+            batch_size=self._batch_size,
+            creation_time=self._creation_time,
+            dynamic=True,
+            num_workers=self._num_workers,
+            timeout_retries=self._retries,
+            connection_error_retries=self._retries,
+            weaviate_error_retries=WeaviateErrorRetryConf(number_retries=self._retries),
+            callback=self._on_result,
+        )
+        with self._client.batch as batch:
+            for doc, uuid, vector in objects:
+                ids.append(
+                    batch.add_data_object(
+                        data_object={self._text_key: doc.page_content, **doc.metadata},
+                        class_name=self._class_name,
+                        uuid=uuid,
+                        vector=vector,
+                    )
+                )
+        return ids
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from src.pyro.routers.files import router
+from src.pyro.services.admission import AdmissionController
+from src.pyro.services.files import FilesService
+
+
+@pytest.fixture
+def answer(monkeypatch):
+    """Replace the RAG pipeline with a stream that stalls after one token."""
+
+    async def tokens():
+        yield "first"
+        await asyncio.Event().wait()
+        yield "never"
+
+    async def _answer(*args):
+        return tokens()
+
+    monkeypatch.setattr(FilesService, "_answer", staticmethod(_answer))
+
+
+def _app(admission: AdmissionController) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    app.state.vectorstore = app.state.embedder = app.state.chat = None
+    app.state.answer_cache = app.state.flights = None
+    app.state.admission = admission
+    return app
+
+
+def _admit(controller, client="other"):
+    return asyncio.run(controller.admit(client))
+
+
+def test_saturated_controller_answers_429_with_retry_after(answer):
+    controller = AdmissionController(max_concurrent=1, max_queue=0)
+    ticket = _admit(controller)
+    ticket.started = time.monotonic() - 3.5
+    ticket.release()
+    _admit(controller)
+
+    response = TestClient(_app(controller)).get("/files/query?question=hi")
+
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Too many queries, try again later"}
+    # One query ahead holding its slot for about 3.5s.
+    assert response.headers["Retry-After"] == "4"
+
+
+def test_queued_query_is_refused_after_max_wait(answer):
+    controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait=0.05)
+    _admit(controller)
+
+    response = TestClient(_app(controller)).get("/files/query?question=hi")
+
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Timed out waiting for capacity"}
+    assert int(response.headers["Retry-After"]) >= 1
+    assert controller.queued == 0
+
+
+def test_queued_query_gets_the_next_free_slot():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait=1)
+        first = await controller.admit("a")
+        waiting = asyncio.create_task(controller.admit("b"))
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+        with pytest.raises(HTTPException) as refused:
+            await controller.admit("c")
+        assert refused.value.status_code == 429
+        first.release()
+        second = await waiting
+        assert (second.client, controller.active, controller.queued) == ("b", 1, 0)
+
+    asyncio.run(main())
+
+
+def test_slot_is_released_when_the_stream_is_closed_early(answer):
+    controller = AdmissionController(max_concurrent=1, max_queue=0)
+    app = _app(controller)
+    messages = []
+
+    async def main():
+        streaming = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await streaming.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if message.get("body"):
+                assert controller.active == 1
+                streaming.set()
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/files/query",
+            "raw_path": b"/files/query",
+            "root_path": "",
+            "query_string": b"question=hi",
+            "headers": [],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        await asyncio.wait_for(app(scope, receive, send), 5)
+
+    asyncio.run(main())
+
+    assert messages[0]["status"] == 200
+    assert messages[1]["body"] == b"data: first\n\n"
+    assert controller.active == 0
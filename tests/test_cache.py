@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from src.pyro.services.cache import SemanticCache
+from src.pyro.utils.embeddings import HashingEmbedder
+
+QUESTION = "How do I sort a list of tuples by the second item?"
+
+
+def _cache(**kwargs):
+    return SemanticCache(HashingEmbedder(), **kwargs)
+
+
+def _ask(cache, question=QUESTION, n_docs=3, temperature=0.0):
+    return asyncio.run(cache.lookup(question, n_docs, temperature))
+
+
+def test_first_generation_clears_answers_cached_before_it():
+    generation = None
+    cache = _cache(generation=lambda: generation, sync_interval=0)
+    vector, answer = _ask(cache)
+    assert answer is None
+    cache.put(vector, 3, 0.0, ["cached before indexing"])
+    assert _ask(cache)[1] == ["cached before indexing"]
+
+    generation = "first-ingest"
+    assert _ask(cache)[1] is None
+    assert cache.stats()["invalidations"] == 1
+
+
+async def _tokens(*tokens):
+    for token in tokens:
+        await asyncio.sleep(0)
+        yield token
+
+
+async def _collect(tokens):
+    return [token async for token in tokens]
+
+
+def test_hit_above_threshold():
+    cache = _cache(threshold=0.95)
+    vector, _ = _ask(cache)
+    cache.put(vector, 3, 0.0, ["Use ", "sorted(key=...)"])
+    assert _ask(cache, QUESTION.upper())[1] == ["Use ", "sorted(key=...)"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_miss_below_threshold():
+    cache = _cache(threshold=0.95)
+    vector, _ = _ask(cache)
+    cache.put(vector, 3, 0.0, ["Use sorted"])
+    other = "How do I sort a list of tuples by the first item?"
+    other_vector, answer = _ask(cache, other)
+    assert answer is None
+    assert 0.5 < float(SemanticCache._normalize(vector) @ other_vector) < 0.95
+
+
+def test_answers_are_bucketed_by_n_docs_and_temperature():
+    cache = _cache(temperature_step=0.25)
+    vector, _ = _ask(cache)
+    cache.put(vector, 3, 0.1, ["cold"])
+    assert _ask(cache, temperature=0.2)[1] == ["cold"]
+    assert _ask(cache, temperature=0.7)[1] is None
+    assert _ask(cache, n_docs=5, temperature=0.1)[1] is None
+
+
+def test_entries_expire_after_ttl():
+    cache = _cache(ttl=0.05)
+    vector, _ = _ask(cache)
+    cache.put(vector, 3, 0.0, ["stale soon"])
+    assert cache.get(vector, 3, 0.0) == ["stale soon"]
+    time.sleep(0.1)
+    assert cache.get(vector, 3, 0.0) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_answers_are_evicted_by_max_chars():
+    cache = _cache(max_chars=10)
+    first, _ = _ask(cache, "first question")
+    second, _ = _ask(cache, "second question")
+    third, _ = _ask(cache, "third question")
+    cache.put(first, 3, 0.0, ["aaaa"])
+    cache.put(second, 3, 0.0, ["bbbb"])
+    assert cache.get(first, 3, 0.0) == ["aaaa"]
+    cache.put(third, 3, 0.0, ["cccc"])
+    assert cache.get(second, 3, 0.0) is None
+    assert cache.get(first, 3, 0.0) == ["aaaa"]
+    assert cache.stats()["evictions"] == 1
+    cache.put(second, 3, 0.0, ["x" * 11])
+    assert cache.get(second, 3, 0.0) is None
+    assert cache.stats()["chars"] == 8
+
+
+def test_clear_on_upload_drops_answers_and_streams_in_flight():
+    cache = _cache()
+    vector, _ = _ask(cache)
+    cache.put(vector, 3, 0.0, ["old answer"])
+
+    async def answer_across_upload():
+        tokens = cache.record(_tokens("new ", "answer"), vector, 3, 0.0)
+        first = await anext(tokens)
+        cache.clear()
+        return [first, *await _collect(tokens)]
+
+    assert asyncio.run(answer_across_upload()) == ["new ", "answer"]
+    assert cache.stats()["entries"] == 0
+    assert cache.get(vector, 3, 0.0) is None
+
+
+def test_recorded_stream_is_replayed():
+    cache = _cache()
+    vector, _ = _ask(cache)
+    tokens = cache.record(_tokens("Use ", "sorted", "()"), vector, 3, 0.0)
+    assert asyncio.run(_collect(tokens)) == ["Use ", "sorted", "()"]
+    chunks = _ask(cache)[1]
+    assert asyncio.run(_collect(cache.replay(chunks))) == ["Use ", "sorted", "()"]
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from evaluation_metrics.ir_metrics import MISSED, first_hits, ir_metrics
+
+
+def _chunk(chunk_id, start, content, file="a.pdf"):
+    return {"id": chunk_id, "file": file, "start_index": start, "content": content}
+
+
+def test_first_hits_matches_ids_and_spans():
+    chunks = [_chunk("x", 0, "0123456789"), _chunk("y", 10, "0123456789")]
+    labels = [["y", {"file": "a.pdf", "start": 5, "end": 15}, "z"]]
+    assert first_hits([chunks], labels).tolist() == [[1, 0, MISSED]]
+
+
+def test_perfect_ranking():
+    metrics = ir_metrics(np.array([[0, 1]]), [1, 2])
+    assert metrics["@2"] == {"recall": 1.0, "mrr": 1.0, "ndcg": 1.0}
+    assert metrics["@1"]["recall"] == 0.5
+
+
+def test_one_chunk_matching_overlapping_labels_counts_once():
+    chunks = [_chunk("x", 0, "0123456789"), _chunk("y", 10, "0123456789")]
+    labels = [
+        [
+            {"file": "a.pdf", "start": 0, "end": 5},
+            {"file": "a.pdf", "start": 3, "end": 8},
+        ]
+    ]
+    hits = first_hits([chunks], labels)
+    assert hits.tolist() == [[0, 0]]
+    for metrics in ir_metrics(hits, [1, 2]).values():
+        assert metrics == {"recall": 1.0, "mrr": 1.0, "ndcg": 1.0}
+
+
+def test_missed_labels_lower_ndcg():
+    metrics = ir_metrics(np.array([[1, MISSED]]), [1, 2])
+    assert metrics["@1"] == {"recall": 0.0, "mrr": 0.0, "ndcg": 0.0}
+    assert metrics["@2"]["mrr"] == 0.5
+    assert metrics["@2"]["ndcg"] == pytest.approx(
+        (1 / np.log2(3)) / (1 + 1 / np.log2(3)), abs=1e-4
+    )
+
+
+def test_padding_and_unlabeled_queries_are_ignored():
+    hits = np.array([[0, -1], [-1, -1]])
+    assert ir_metrics(hits, [1])["@1"]["ndcg"] == 1.0
+    assert ir_metrics(np.full((1, 1), -1), [1]) == {}
@@ -0,0 +1,77 @@
+import asyncio
+
+import openai
+import pytest
+from evaluation_metrics import judge
+from evaluation_metrics.judge import parse_score
+
+METRICS = {"faithfulness": "...", "answer_relevance": "..."}
+
+
+@pytest.mark.parametrize(
+    ("response", "score"),
+    [("0.8", 0.8), (" 1\n", 1.0), (".25", 0.25), ('{"score": 0.4}', 0.4)],
+)
+def test_parse_score_accepts_a_bare_or_json_score(response, score):
+    assert parse_score(response) == score
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        "1. Faithfulness: 0.2",
+        "The score is 0.7",
+        "1.5",
+        "-0.1",
+        '{"score": "0.4"}',
+        '{"faithfulness": 0.4}',
+        "NaN",
+        "",
+        None,
+    ],
+)
+def test_parse_score_rejects_anything_else(response):
+    with pytest.raises(ValueError):
+        parse_score(response)
+
+
+def _judge(monkeypatch, replies):
+    """Run judge_metrics with the judge answering from ``replies``."""
+    formats = []
+
+    async def query_openai(messages, response_format):
+        formats.append(response_format["type"])
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    async def fallback():
+        return 0.5
+
+    monkeypatch.setattr(judge, "query_openai", query_openai)
+    fallbacks = dict.fromkeys(METRICS, fallback)
+    scores = asyncio.run(judge.judge_metrics({"query": "q"}, METRICS, fallbacks))
+    return scores, formats
+
+
+def test_invalid_batched_scores_are_judged_separately(monkeypatch):
+    monkeypatch.setattr(judge, "mode", "batched")
+    monkeypatch.setattr(judge, "structured", True)
+    scores, formats = _judge(
+        monkeypatch, ['{"faithfulness": 0.9, "answer_relevance": "high"}']
+    )
+    assert scores == [0.9, 0.5]
+    assert formats == ["json_schema"]
+
+
+def test_rejected_schema_falls_back_to_json_object_then_separate(monkeypatch):
+    rejected = openai.BadRequestError.__new__(openai.BadRequestError)
+    monkeypatch.setattr(judge, "mode", "batched")
+    monkeypatch.setattr(judge, "structured", True)
+
+    assert _judge(monkeypatch, [rejected]) == ([0.5, 0.5], ["json_schema"])
+    assert (judge.mode, judge.structured) == ("batched", False)
+    assert _judge(monkeypatch, [rejected]) == ([0.5, 0.5], ["json_object"])
+    assert judge.mode == "separate"
+    assert _judge(monkeypatch, []) == ([0.5, 0.5], [])
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pytest
+from src.pyro.utils.pdf import _page_texts, iter_pages
+
+FIXTURE = str(Path(__file__).parents[1] / "pdfs" / "howto-sorting.pdf")
+
+
+class _Box:
+    def __init__(self, text, x0, top):
+        self.text = text
+        self.bbox = (x0, top - 10, x0 + 100, top)
+
+    def get_text(self):
+        return self.text
+
+
+class _Page(list):
+    height = 100
+
+
+def test_bullets_are_cleaned():
+    page = _Page([_Box("• first item\n", 10, 90), _Box("plain text\n", 10, 80)])
+    assert _page_texts(page) == ["first item", "plain text"]
+
+
+def test_ties_are_broken_by_element_id():
+    # sha256("b") sorts before sha256("a"), unlike insertion order
+    page = _Page([_Box("a", 10, 90), _Box("b", 10, 90)])
+    assert _page_texts(page) == ["b", "a"]
+
+
+def test_matches_partition_pdf_fast_strategy():
+    nltk = pytest.importorskip("nltk")
+    try:
+        nltk.data.find("tokenizers/punkt")
+        nltk.data.find("taggers/averaged_perceptron_tagger")
+    except LookupError:
+        pytest.skip("partition_pdf needs the NLTK punkt and tagger data")
+    from unstructured.partition.pdf import partition_pdf
+
+    expected = [el.text for el in partition_pdf(filename=FIXTURE, strategy="fast")]
+    assert [text for _, texts in iter_pages(FIXTURE, 10) for text in texts] == expected
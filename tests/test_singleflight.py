@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from src.pyro.services.singleflight import SingleFlight
+
+KEY = SingleFlight.key("How do I sort a list?", 3, 0.0)
+
+
+async def _collect(tokens):
+    return [token async for token in tokens]
+
+
+def test_identical_concurrent_queries_run_once():
+    calls = 0
+
+    async def answer():
+        for token in ("Use ", "sorted", "()"):
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def start():
+        nonlocal calls
+        calls += 1
+        return answer()
+
+    async def ask(flights):
+        return await _collect(await flights.join(KEY, start))
+
+    async def main():
+        flights = SingleFlight()
+        return await asyncio.gather(ask(flights), ask(flights))
+
+    assert asyncio.run(main()) == [["Use ", "sorted", "()"]] * 2
+    assert calls == 1
+
+
+def test_joiner_receives_the_leaders_start_error():
+    async def start():
+        await asyncio.sleep(0.01)
+        raise ValueError("no documents")
+
+    async def main():
+        flights = SingleFlight()
+        return await asyncio.gather(
+            flights.join(KEY, start), flights.join(KEY, start), return_exceptions=True
+        )
+
+    leader, joiner = asyncio.run(main())
+    assert isinstance(joiner, ValueError)
+    assert joiner is leader
+
+
+def test_joiner_receives_the_leaders_stream_error():
+    async def answer():
+        yield "partial"
+        await asyncio.sleep(0.01)
+        raise ValueError("the model went away")
+
+    async def start():
+        return answer()
+
+    async def main():
+        flights = SingleFlight()
+        leader = await flights.join(KEY, start)
+        joiner = await flights.join(KEY, start)
+        return await asyncio.gather(
+            _collect(leader), _collect(joiner), return_exceptions=True
+        )
+
+    leader, joiner = asyncio.run(main())
+    assert isinstance(leader, ValueError)
+    assert joiner is leader
+
+
+def test_last_subscriber_leaving_cancels_the_pipeline():
+    async def main():
+        flights = SingleFlight()
+        stopped = asyncio.Event()
+
+        async def answer():
+            try:
+                yield "first"
+                await asyncio.Event().wait()
+                yield "never"
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        async def start():
+            return answer()
+
+        leader = await flights.join(KEY, start)
+        joiner = await flights.join(KEY, start)
+        assert await anext(leader) == "first"
+        await leader.aclose()
+        await asyncio.sleep(0)
+        assert not stopped.is_set()
+        await joiner.aclose()
+        await asyncio.wait_for(stopped.wait(), 1)
+        # A new request for the key starts a new flight.
+        restarted = await flights.join(KEY, start)
+        assert await anext(restarted) == "first"
+        await restarted.aclose()
+
+    asyncio.run(main())
+
+
+def test_followers_of_a_cancelled_pipeline_get_an_error():
+    async def main():
+        flights = SingleFlight()
+
+        async def answer():
+            await asyncio.Event().wait()
+            yield "never"
+
+        async def start():
+            return answer()
+
+        leader = await flights.join(KEY, start)
+        joiner = await flights.join(KEY, start)
+        waiting = asyncio.create_task(anext(joiner))
+        await asyncio.sleep(0)
+        flights._flights[KEY].task.cancel()
+        with pytest.raises(RuntimeError, match="cancelled"):
+            await waiting
+        await leader.aclose()
+
+    asyncio.run(main())
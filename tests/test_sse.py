@@ -0,0 +1,83 @@
+import asyncio
+
+from src.pyro.utils.sse import coalesce, event_stream, format_event
+
+
+async def _tokens(*steps, error=None):
+    """Yield the string steps and sleep for the float ones."""
+    for step in steps:
+        if isinstance(step, float):
+            await asyncio.sleep(step)
+        else:
+            yield step
+    if error is not None:
+        raise error
+
+
+def _frames(tokens, timings=None):
+    async def collect():
+        return [frame async for frame in event_stream(tokens, timings)]
+
+    return asyncio.run(collect())
+
+
+def test_format_event_splits_lines():
+    assert format_event("a\r\nb") == "data: a\ndata: b\n\n"
+    assert format_event("", event="end") == "event: end\ndata: \n\n"
+
+
+def test_first_token_is_sent_at_once_and_the_rest_grouped():
+    async def collect():
+        tokens = _tokens("a", 0.01, "b", 0.01, "c", 0.2, "d")
+        return [chunk async for chunk in coalesce(tokens, interval=0.05)]
+
+    assert asyncio.run(collect()) == ["a", "bc", "d"]
+
+
+def test_chunks_are_flushed_at_max_chars():
+    async def collect():
+        tokens = _tokens("a", 0.01, "bb", "cc", "d")
+        return [chunk async for chunk in coalesce(tokens, interval=1, max_chars=3)]
+
+    assert asyncio.run(collect()) == ["a", "bbcc", "d"]
+
+
+def test_buffered_tokens_are_sent_before_the_error():
+    tokens = _tokens("a", 0.01, "b", "c", error=ValueError("model failed"))
+    assert _frames(tokens, {"embed": 0.01}) == [
+        "data: a\n\n",
+        "data: bc\n\n",
+        "event: error\ndata: model failed\n\n",
+    ]
+
+
+def test_timing_event_comes_before_end():
+    tokens = _tokens("Hello", " world")
+    assert _frames(tokens, {"embed": 0.0123, "llm": 1.5}) == [
+        "data: Hello world\n\n",
+        'event: timing\ndata: {"embed": 12.3, "llm": 1500.0}\n\n',
+        "event: end\ndata: \n\n",
+    ]
+
+
+def test_closing_the_stream_cancels_the_prefetched_token():
+    cancelled = False
+
+    async def tokens():
+        nonlocal cancelled
+        yield "a"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        yield "never"
+
+    async def main():
+        chunks = coalesce(tokens())
+        assert await anext(chunks) == "a"
+        await chunks.aclose()
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled